@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Measure AsyncDiagramRenderer latency under concurrent requests.
+
+Starts --concurrency clients that each render the same generated diagram
+until --requests renders are done in total, then reports the p50 and p99
+latency of a request (including time spent waiting for a free slot) and the
+overall throughput.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from diaglang import AsyncDiagramRenderer
+
+
+def make_source(lines):
+    """A diagram mixing single connections, chains and fan-outs, one per line"""
+    source = []
+    for i in range(lines):
+        kind = i % 3
+        if kind == 0:
+            source.append(f"Rectangle(Web {i}) connects to(HTTP) horizontal Circle(LB {i})")
+        elif kind == 1:
+            source.append(f"Square(Q{i}) connects to vertical Diamond(D{i}) connects to horizontal Triangle(T{i})")
+        else:
+            source.append(f"Rectangle(Src {i}) connects to horizontal Rectangle(A{i}) and Rectangle(B{i})")
+    return "\n".join(source)
+
+
+async def run(args):
+    source = make_source(args.lines)
+    latencies = []
+    remaining = args.requests
+
+    async with AsyncDiagramRenderer(executor=args.executor, max_workers=args.workers,
+                                    max_concurrency=args.max_concurrency) as renderer:
+        await renderer.render(source)  # warm up the pool
+
+        async def client():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                await renderer.render(source)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=320, help='Total renders across all clients')
+    parser.add_argument('--lines', type=int, default=50, help='Lines in the rendered diagram')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='process')
+    parser.add_argument('--workers', type=int, help='Pool size (default: CPU count)')
+    parser.add_argument('--max-concurrency', type=int, help='Renders handed to the pool at once (default: pool size)')
+    parser.add_argument('--budget-p99-ms', type=float,
+                        help='Fail if the p99 latency exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    latencies, elapsed = asyncio.run(run(args))
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    p50, p99 = percentiles[49] * 1000, percentiles[98] * 1000
+    print(f"{len(latencies)} renders of {args.lines} lines, {args.concurrency} concurrent clients, "
+          f"{args.executor} executor: p50 {p50:.1f} ms, p99 {p99:.1f} ms, "
+          f"{len(latencies) / elapsed:.1f} renders/s")
+    return 0 if args.budget_p99_ms is None or p99 <= args.budget_p99_ms else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Compare the pure-Python and NumPy canvas backends on large scenes.
+
+Lays out each scene once, then times painting it to a string with each
+backend (the best of --repeat runs) and checks that both give the same text.
+Layout doesn't depend on the backend, so painting is where they differ.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from diaglang import DiagramRenderer
+from diaglang.canvas import get_canvas_class
+from diaglang.scene import ScenePainter
+
+
+def network_scene(renderer, nodes, edges):
+    """A random network: nodes boxes joined by edges wires through a layered layout"""
+    rng = random.Random(1)
+    lines = [f"Rectangle(N{rng.randrange(nodes)}) connects to horizontal Rectangle(N{rng.randrange(nodes)})"
+             for _ in range(edges)]
+    network = renderer.network_system.parse_network(lines)
+    return renderer.network_system.layout_network(network)
+
+
+def fan_out_scene(renderer, targets):
+    """One source bussed to targets boxes"""
+    line = "Rectangle(Source) connects to horizontal " + " and ".join(f"Rectangle(T{i})" for i in range(targets))
+    divergent = renderer.divergent_connections.parse_divergent_connections(line)
+    return renderer.divergent_connections.layout_divergent_connections(divergent)
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=800, help='Nodes in the network scene')
+    parser.add_argument('--edges', type=int, default=1600, help='Edges in the network scene')
+    parser.add_argument('--targets', type=int, default=5000, help='Targets in the fan-out scene')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    numpy_canvas = get_canvas_class('numpy')
+    if numpy_canvas is get_canvas_class('python'):
+        print("NumPy is not installed", file=sys.stderr)
+        return 1
+
+    renderer = DiagramRenderer()
+    scenes = [
+        (f"network, {args.nodes} nodes and {args.edges} edges", network_scene(renderer, args.nodes, args.edges)),
+        (f"fan-out to {args.targets} targets", fan_out_scene(renderer, args.targets)),
+    ]
+    for name, scene in scenes:
+        times = []
+        outputs = []
+        for backend in ('python', 'numpy'):
+            painter = ScenePainter(renderer.shape_renderer, get_canvas_class(backend))
+            elapsed, output = best_time(lambda: painter.paint_string(scene), args.repeat)
+            times.append(elapsed)
+            outputs.append(output)
+        if outputs[0] != outputs[1]:
+            print(f"{name}: backends disagree", file=sys.stderr)
+            return 1
+        rows = outputs[0].split('\n')
+        print(f"{name} ({len(rows)} x {max(map(len, rows))} cells): python {times[0] * 1000:.0f} ms, "
+              f"numpy {times[1] * 1000:.0f} ms, {times[0] / times[1]:.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
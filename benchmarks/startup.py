@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Check that importing diaglang stays within a startup time budget.
+
+Runs `python -X importtime` on a small import statement several times and
+reports the median cumulative time spent importing diaglang modules.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def diaglang_import_us(statement):
+    """Microseconds spent importing diaglang (and what it pulls in) for one fresh interpreter"""
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            capture_output=True, text=True, env=env, check=True)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        # Top-level entries only: nested imports are already in their parent's cumulative time
+        if name.startswith(' diaglang'):
+            total += int(cumulative_us)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=40.0,
+                        help='Fail if the median import time exceeds this many milliseconds')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--statement', default='from diaglang import DiagramRenderer',
+                        help='Python statement whose imports are measured')
+    args = parser.parse_args()
+
+    diaglang_import_us(args.statement)  # warm up bytecode caches
+    timings = [diaglang_import_us(args.statement) / 1000 for _ in range(args.runs)]
+    median = statistics.median(timings)
+    print(f"{args.statement!r}: median {median:.1f} ms over {args.runs} runs "
+          f"(budget {args.budget_ms:.1f} ms)")
+    return 0 if median <= args.budget_ms else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
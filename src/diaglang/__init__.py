@@ -1,20 +1,58 @@
-# Main API exports for backward compatibility
-from .diagram_renderer import DiagramRenderer
-from .file_operations import FileOperations
-from .shape_renderer import ShapeRenderer
-from .connection_system import ConnectionSystem
-from .chain_system import ChainSystem
-from .divergent_connections import DivergentConnections
+# Main API exports for backward compatibility.
+# Submodules are imported lazily on first attribute access to keep CLI startup fast.
+import importlib
+
+from .version import __version__
+
+_EXPORTS = {
+    'DiagramRenderer': '.diagram_renderer',
+    'AsyncDiagramRenderer': '.async_renderer',
+    'FileOperations': '.file_operations',
+    'ShapeRenderer': '.shape_renderer',
+    'ConnectionSystem': '.connection_system',
+    'ChainSystem': '.chain_system',
+    'DivergentConnections': '.divergent_connections',
+    'Lexer': '.lexer',
+    'RenderCache': '.render_cache',
+    'Canvas': '.canvas',
+    'Scene': '.scene',
+    'ScenePainter': '.scene',
+    'RenderLimits': '.limits',
+    'RenderLimitExceeded': '.limits',
+}
 
 # For backward compatibility, maintain the original DiagReader interface
-DiagReader = DiagramRenderer
+_ALIASES = {
+    'DiagReader': 'DiagramRenderer',
+}
 
 __all__ = [
     'DiagramRenderer',
     'DiagReader',  # Backward compatibility alias
+    'AsyncDiagramRenderer',
     'FileOperations',
     'ShapeRenderer', 
     'ConnectionSystem',
     'ChainSystem',
-    'DivergentConnections'
-]
\ No newline at end of file
+    'DivergentConnections',
+    'Lexer',
+    'RenderCache',
+    'Canvas',
+    'Scene',
+    'ScenePainter',
+    'RenderLimits',
+    'RenderLimitExceeded'
+]
+
+
+def __getattr__(name):
+    export = _ALIASES.get(name, name)
+    if export not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[export], __name__), export)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
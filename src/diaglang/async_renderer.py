@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+from .file_operations import FileOperations
+from .worker_pool import init_worker_renderer, worker_renderer
+
+
+def _render_text(text, default_shape):
+    return worker_renderer().render_string(text, default_shape=default_shape)
+
+
+class AsyncDiagramRenderer:
+    """Renders diagrams from asyncio code without blocking the event loop.
+
+    Rendering runs in a pool of threads (executor="thread") or processes
+    (executor="process") of max_workers workers, each with its own
+    DiagramRenderer. At most max_concurrency renders (max_workers by default)
+    are handed to the pool at once; the rest wait their turn.
+
+    Cancelling a render drops it if it hasn't started. A render already running
+    can't be interrupted, so it keeps its place until it finishes and the pool
+    is never asked for more than max_concurrency renders at a time.
+    """
+
+    def __init__(self, executor="thread", max_workers=None, max_concurrency=None,
+                 canvas_backend=None, limits=None):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        if executor == "thread":
+            executor_class = ThreadPoolExecutor
+        elif executor == "process":
+            executor_class = ProcessPoolExecutor
+        else:
+            raise ValueError(f"executor must be 'thread' or 'process', not {executor!r}")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.max_workers
+        self.executor = executor_class(max_workers=self.max_workers, initializer=init_worker_renderer,
+                                       initargs=(None, canvas_backend, limits))
+        self.file_operations = FileOperations()
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def render(self, text, default_shape=None):
+        """Render diagram source held in memory, like DiagramRenderer.render_string"""
+        async with self._slots:
+            return await self._run(_render_text, text, default_shape)
+
+    async def render_file(self, filename, default_shape=None):
+        """Render a .diag file like DiagramRenderer.render_ascii, reading it off the event loop"""
+        text = await asyncio.to_thread(self.file_operations.read_file, filename)
+        return await self.render(text, default_shape)
+
+    async def _run(self, function, *args):
+        future = self.executor.submit(function, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Not started: cancelled along with the wrapper. Running: wait it out.
+            if not future.done():
+                await asyncio.wait([asyncio.wrap_future(future)])
+            raise
+
+    def close(self):
+        """Shut the pool down, dropping renders that haven't started"""
+        self.executor.shutdown(cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.to_thread(self.close)
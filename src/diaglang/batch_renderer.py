@@ -0,0 +1,83 @@
+import glob
+import os
+
+from .worker_pool import init_worker_renderer, worker_renderer
+
+
+def _render_file(task):
+    """Render one file, returning (filename, output, error, cache_hit)"""
+    filename, default_shape = task
+    renderer = worker_renderer()
+    render_cache = renderer.render_cache
+    hits = render_cache.hits if render_cache else 0
+    try:
+        output = renderer.render_ascii(filename, default_shape=default_shape)
+    except (OSError, UnicodeDecodeError) as e:
+        return filename, None, str(e), False
+    return filename, output, None, bool(render_cache) and render_cache.hits > hits
+
+
+class BatchRenderer:
+    def __init__(self, jobs=1, default_shape=None, cache_dir=None):
+        self.jobs = max(1, jobs)
+        self.default_shape = default_shape
+        self.cache_dir = cache_dir
+
+    def expand_inputs(self, paths):
+        """Resolve files, directories (searched recursively for .diag files) and globs, in order"""
+        files = []
+        seen = set()
+        missing = []
+        for path in paths:
+            if os.path.isdir(path):
+                matches = sorted(glob.glob(os.path.join(path, '**', '*.diag'), recursive=True))
+            elif any(char in path for char in '*?['):
+                matches = sorted(glob.glob(path, recursive=True))
+            else:
+                matches = [path]
+
+            if not matches:
+                missing.append(path)
+            for match in matches:
+                if match not in seen:
+                    seen.add(match)
+                    files.append(match)
+        return files, missing
+
+    def render_files(self, filenames):
+        """Render every file, returning (filename, output, error, cache_hit) tuples in input order"""
+        tasks = [(filename, self.default_shape) for filename in filenames]
+        if self.jobs == 1 or len(tasks) < 2:
+            if worker_renderer() is None or self._cache_dir_changed():
+                init_worker_renderer(self.cache_dir)
+            return [_render_file(task) for task in tasks]
+
+        from concurrent.futures import ProcessPoolExecutor
+        
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker_renderer,
+                                 initargs=(self.cache_dir,)) as executor:
+            return list(executor.map(_render_file, tasks, chunksize=max(1, len(tasks) // (self.jobs * 4))))
+
+    def _cache_dir_changed(self):
+        render_cache = worker_renderer().render_cache
+        return (render_cache.cache_dir if render_cache else None) != self.cache_dir
+
+    def output_root(self, paths):
+        """The deepest directory holding every input path, which output paths mirror"""
+        directories = []
+        for path in paths:
+            if not os.path.isdir(path):
+                magic = [path.find(char) for char in '*?[' if char in path]
+                if magic:
+                    path = path[:min(magic)]
+                path = os.path.dirname(path)
+            directories.append(os.path.abspath(path))
+        return os.path.commonpath(directories) if directories else os.getcwd()
+
+    def output_path(self, filename, output_dir, root=None):
+        """<output_dir>/<path>.txt, path being the file's path below root, or just its name without a root"""
+        if root is None:
+            relative = os.path.basename(filename)
+        else:
+            relative = os.path.relpath(os.path.abspath(filename), root)
+        return os.path.join(output_dir, os.path.splitext(relative)[0] + '.txt')
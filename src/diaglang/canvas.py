@@ -0,0 +1,132 @@
+class Canvas:
+    """A growable grid of text that renderers draw into.
+
+    Each row is a list of string pieces plus its length, so drawing after the
+    end of a row is a single append and nothing already drawn is copied again.
+    Drawing over existing text splices the row once. Rows keep their own length:
+    a row is as long as the furthest column written to it, which preserves the
+    exact (sometimes ragged) row widths of the diagrams. Everything is turned
+    into a string once, by to_string().
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.lengths = []
+        self.width = 0  # Length of the longest row
+
+    @property
+    def height(self):
+        return len(self.rows)
+
+    def row_length(self, y):
+        return self.lengths[y] if y < len(self.lengths) else 0
+
+    def row_text(self, y):
+        if y >= len(self.rows):
+            return ''
+        pieces = self.rows[y]
+        if len(pieces) > 1:
+            # Keep the joined row so repeated reads don't join it again
+            pieces[:] = [''.join(pieces)]
+        return pieces[0] if pieces else ''
+
+    def char_at(self, x, y):
+        line = self.row_text(y)
+        return line[x] if x < len(line) else ' '
+
+    def ensure_rows(self, height):
+        while len(self.rows) < height:
+            self.rows.append([])
+            self.lengths.append(0)
+
+    def write(self, x, y, text):
+        """Draw text starting at column x of row y, padding the row with spaces up to x"""
+        if y >= len(self.rows):
+            self.ensure_rows(y + 1)
+        length = self.lengths[y]
+        if x >= length:
+            pieces = self.rows[y]
+            if x > length:
+                pieces.append(' ' * (x - length))
+            pieces.append(text)
+            length = x + len(text)
+        else:
+            line = self.row_text(y)
+            line = line[:x] + text + line[x + len(text):]
+            self.rows[y] = [line]
+            length = len(line)
+        self.lengths[y] = length
+        if length > self.width:
+            self.width = length
+
+    def append(self, y, text):
+        """Draw text right after the current end of row y"""
+        if y >= len(self.rows):
+            self.ensure_rows(y + 1)
+        self.rows[y].append(text)
+        length = self.lengths[y] + len(text)
+        self.lengths[y] = length
+        if length > self.width:
+            self.width = length
+
+    def pad(self, y, width):
+        """Extend row y with spaces until it is at least width long"""
+        if self.row_length(y) < width:
+            self.write(width, y, '')
+
+    def blit(self, shape, x, y):
+        """Draw a shape (a RenderedShape or a sequence of lines) with its top-left corner at (x, y)"""
+        for i, line in enumerate(getattr(shape, 'lines', shape)):
+            self.write(x, y + i, line)
+
+    def hline(self, x, y, length, char='─'):
+        self.write(x, y, char * length)
+
+    def vline(self, x, y, length, char='│'):
+        for i in range(length):
+            self.write(x, y + i, char)
+
+    # Batches of the calls above, drawn in order. Canvases that can draw a whole
+    # batch at once (see NumpyCanvas) override these.
+
+    def blits(self, placements):
+        """Draw (shape, x, y) placements"""
+        for shape, x, y in placements:
+            self.blit(shape, x, y)
+
+    def writes(self, texts):
+        """Draw (x, y, text) runs of text"""
+        for x, y, text in texts:
+            self.write(x, y, text)
+
+    def hlines(self, runs, char='─'):
+        """Draw (x, y, length) horizontal lines"""
+        for x, y, length in runs:
+            self.hline(x, y, length, char)
+
+    def vlines(self, runs, char='│'):
+        """Draw (x, y, length) vertical lines"""
+        for x, y, length in runs:
+            self.vline(x, y, length, char)
+
+    def lines(self):
+        return [''.join(row) for row in self.rows]
+
+    def to_string(self):
+        return '\n'.join([''.join(row) for row in self.rows])
+
+
+def get_canvas_class(backend=None):
+    """Return the canvas class for a backend name: 'python' (the default) or 'numpy'.
+
+    The NumPy backend falls back to the pure-Python Canvas when NumPy is not installed.
+    """
+    if backend in (None, 'python'):
+        return Canvas
+    if backend == 'numpy':
+        try:
+            from .numpy_canvas import NumpyCanvas
+        except ImportError:
+            return Canvas
+        return NumpyCanvas
+    raise ValueError(f"unknown canvas backend {backend!r}; use 'python' or 'numpy'")
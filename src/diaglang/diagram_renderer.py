@@ -1,19 +1,55 @@
+import functools
+import itertools
+from array import array
+
 from .file_operations import FileOperations
 from .shape_renderer import ShapeRenderer
 from .connection_system import ConnectionSystem
 from .chain_system import ChainSystem
 from .divergent_connections import DivergentConnections
 from .network_system import NetworkSystem
+from .lexer import Lexer
+from .limits import RenderLimitExceeded, limit_notice
+from .canvas import get_canvas_class
+from .render_memo import RenderMemo
+from .parsed_diagram import LazyStatements, ParsedDiagram
+from .worker_pool import WorkerPool, init_worker_renderer, worker_renderer
+
+
+# Diagrams with fewer lines than this are rendered serially even with workers
+MIN_PARALLEL_LINES = 64
+# Most lines sent to a worker at once
+MAX_CHUNK_LINES = 512
+
+
+def _render_item(item):
+    """Render one lexed line in a worker process; blocks already drawn pass through"""
+    return item if isinstance(item, str) else worker_renderer()._render_statement(item)
 
 
 class DiagramRenderer:
-    def __init__(self):
+    def __init__(self, render_cache=None, canvas_backend=None, workers=1, limits=None):
+        self.render_cache = render_cache
+        self.limits = limits  # RenderLimits for untrusted input, or None for unlimited
+        self.canvas_backend = canvas_backend
+        self.workers = workers  # Processes rendering independent lines (and network components) in parallel
+        # Started by the first render that needs it and kept until close()
+        self.pool = WorkerPool(workers, init_worker_renderer, (None, canvas_backend)) if workers > 1 else None
         self.file_operations = FileOperations()
+        # One instance of each component, shared by every subsystem
+        self.lexer = Lexer()
         self.shape_renderer = ShapeRenderer()
-        self.connection_system = ConnectionSystem()
-        self.chain_system = ChainSystem()
-        self.divergent_connections = DivergentConnections()
-        self.network_system = NetworkSystem(self.shape_renderer, self.connection_system)
+        self.canvas_class = get_canvas_class(canvas_backend)
+        self.connection_system = ConnectionSystem(self.shape_renderer, self.lexer, self.canvas_class)
+        self.chain_system = ChainSystem(self.connection_system, self.shape_renderer, self.lexer, self.canvas_class)
+        self.divergent_connections = DivergentConnections(self.shape_renderer, self.lexer, self.canvas_class)
+        self.network_system = NetworkSystem(self.shape_renderer, self.connection_system, self.lexer, self.canvas_class,
+                                            workers=workers, pool=self.pool)
+    
+    def close(self):
+        """Stop the worker processes, if any were started"""
+        if self.pool is not None:
+            self.pool.close()
     
     # Expose file operations methods for backward compatibility with tests
     def read_file(self, filename):
@@ -26,173 +62,266 @@ class DiagramRenderer:
         """Convert bare labels to full shape syntax when default_shape is specified"""
         if not default_shape:
             return input_text
-            
-        import re
-        
-        # Pattern to find bare labels (words without parentheses that aren't already part of Shape(label) syntax)
-        # This should match words that are:
-        # 1. At the beginning of the string, or
-        # 2. After "connects to" clauses, or  
-        # 3. After "and" keywords
-        # But NOT words that are already part of Shape(label) syntax
-        
-        # First, let's handle connections with bare labels
-        # Pattern: "label connects to" where label is not Shape(label)
-        # Updated to handle multi-word labels (words and spaces, but not other syntax elements)
-        pattern_from = r'^([a-zA-Z_][a-zA-Z0-9_\s]*?)\s+connects\s+to'
-        
-        def replace_from_shape(match):
-            label = match.group(1).strip()
-            return f"{default_shape.capitalize()}({label}) connects to"
-        
-        result = re.sub(pattern_from, replace_from_shape, input_text)
-        
-        # Pattern: after direction keywords, find bare labels
-        # Look for "horizontal label" or "vertical label" where label is not Shape(label)
-        # Updated to handle multi-word labels at end of string
-        pattern_to = r'\b(horizontal|vertical)\s+([a-zA-Z_][a-zA-Z0-9_\s]*?)$'
-        
-        def replace_to_shape(match):
-            direction = match.group(1)
-            label = match.group(2).strip()
-            return f"{direction} {default_shape.capitalize()}({label})"
-            
-        result = re.sub(pattern_to, replace_to_shape, result)
-        
-        # Handle "and" cases: "and label"
-        # Updated to handle multi-word labels at end of string or before other keywords
-        pattern_and = r'\band\s+([a-zA-Z_][a-zA-Z0-9_\s]*?)(?=\s|$)'
-        
-        def replace_and_shape(match):
-            label = match.group(1).strip()
-            return f"and {default_shape.capitalize()}({label})"
-            
-        result = re.sub(pattern_and, replace_and_shape, result)
-        
-        # Handle standalone labels (entire string is just a label)
-        # This should only match if the string doesn't contain "connects to" or other syntax
-        if " connects to" not in result and not re.search(r'[(){}]', result):
-            # It's likely a standalone label
-            label = result.strip()
-            if label and re.match(r'^[a-zA-Z_][a-zA-Z0-9_\s]*$', label):
-                result = f"{default_shape.capitalize()}({label})"
-        
-        return result
+        return self.lexer.apply_default_shape(input_text, default_shape)
     
     def _validate_syntax(self, shape_input):
         """Validate syntax and return error message if invalid, None if valid"""
-        import re
+        return self._validate_statement(self.lexer.parse_line(shape_input))
+    
+    def _validate_statement(self, statement):
+        shape_input = statement.text
         
         # Check for connection syntax without direction
-        if " connects to" in shape_input:
-            # Check if it has direction keywords
-            if not re.search(r'\b(horizontal|vertical)\b', shape_input):
+        for connector in statement.connectors:
+            if connector.horizontal is None:
                 return f"SYNTAX ERROR in '{shape_input}'\nMissing direction keyword. Use 'horizontal' or 'vertical'.\nExample: Rectangle(A) connects to horizontal Triangle(B)"
-            
-            # Check for invalid arrow types
-            arrow_match = re.search(r'connects\s+to\(([^,)]+)(?:,\s*([^)]+))?\)', shape_input)
-            if arrow_match:
-                first_part = arrow_match.group(1).strip() if arrow_match.group(1) else ""
-                second_part = arrow_match.group(2).strip() if arrow_match.group(2) else ""
-                
-                # If there's a comma, the second part should be the arrow type
-                if second_part:
-                    if second_part not in ["point to", "point back", "double point"]:
-                        return f"SYNTAX ERROR in '{shape_input}'\nInvalid arrow type: '{second_part}'\nValid arrow types: 'point to', 'point back', 'double point'"
-                # If no comma, check if the first part looks like it's trying to be an arrow type
-                elif first_part and (" arrow" in first_part or "point" in first_part):
-                    # This looks like it's trying to be an arrow type - validate it
-                    if first_part not in ["point to", "point back", "double point"]:
-                        return f"SYNTAX ERROR in '{shape_input}'\nInvalid arrow type: '{first_part}'\nValid arrow types: 'point to', 'point back', 'double point'"
+        
+        # Check for invalid arrow types
+        for connector in statement.connectors:
+            if connector.invalid_arrow:
+                return f"SYNTAX ERROR in '{shape_input}'\nInvalid arrow type: '{connector.invalid_arrow}'\nValid arrow types: 'point to', 'point back', 'double point'"
         
         return None
     
     def render_ascii(self, filename, default_shape=None):
-        shapes = self.file_operations.parse_shapes(filename)
-        if not shapes:
-            return ""
+        if self.render_cache is None or self.limits is not None:
+            return self._render_shapes(self.file_operations.lazy_shapes(filename), default_shape)
+        # Hash and render the same bytes, so an edit in between can't be cached under the old key
+        data = self.file_operations.read_bytes(filename)
+        return self._render_cached(self.render_cache.key_for_bytes(data, default_shape),
+                                   self.file_operations.parse_bytes(data), default_shape)
+    
+    def render_string(self, text, default_shape=None):
+        """Render diagram source held in memory, exactly as render_ascii would render it from a file"""
+        shapes = self.file_operations.parse_text(text)
+        if self.render_cache is None or self.limits is not None:
+            # Limited renders can depend on timing, so they are never cached
+            return self._render_shapes(shapes, default_shape)
+        return self._render_cached(self.render_cache.key_for_text(text, default_shape), shapes, default_shape)
+    
+    def render_lines(self, lines, default_shape=None):
+        """Render an iterable of source lines (trailing newlines allowed), e.g. an open file or a list"""
+        return self._render_shapes(self.file_operations.parse_lines(lines), default_shape)
+    
+    def iter_render(self, filename, default_shape=None):
+        """Yield the title and each rendered block as soon as it is ready.
+        
+        Joining the yielded blocks with blank lines gives exactly render_ascii's output.
+        """
+        return self._iter_shapes(self.file_operations.lazy_shapes(filename), default_shape)
+    
+    def _render_cached(self, key, shapes, default_shape):
+        result = self.render_cache.get(key)
+        if result is None:
+            result = self._render_shapes(shapes, default_shape)
+            self.render_cache.put(key, result)
+        return result
+    
+    def render_incremental(self, filename, previous=None, default_shape=None):
+        """Render like render_ascii, reusing unchanged lines' work from a previous RenderMemo.
+        
+        Returns (output, memo); pass the memo back in on the next render of the same file.
+        """
+        memo = RenderMemo(previous)
+        return self._render_shapes(self.file_operations.lazy_shapes(filename), default_shape, memo), memo
+    
+    def _render_shapes(self, shapes, default_shape=None, memo=None):
+        return "\n\n".join(self._iter_shapes(shapes, default_shape, memo))
+    
+    def parse_diagram(self, shapes, default_shape=None, memo=None, budget=None):
+        """Parse a source into a ParsedDiagram, or return None for an empty source.
+        
+        shapes may be any iterable of lines: a list or FileOperations.lazy_shapes.
+        A first pass lexes connection lines, which is all network detection
+        needs, and keeps their statements. A syntax error in any of them keeps
+        the diagram off the network path, so the per-line renderers report it. Every statement is kept if the
+        diagram may be a network; otherwise the other lines are lexed as they
+        are rendered, so each line is rewritten and lexed once either way. A
+        RenderBudget, if given, has its time limit checked after every line.
+        """
+        apply_default_shape = functools.partial(self._apply_default_shape, default_shape=default_shape)
+        parse_line = self.lexer.parse_line
+        if memo is not None:
+            apply_default_shape = memo.wrap(("default_shape", default_shape), apply_default_shape)
+            parse_line = memo.wrap("parse", parse_line)
+        
+        if iter(shapes) is shapes:
+            shapes = list(shapes)  # A one-shot iterator can't be read twice
+        first = next(iter(shapes), None)
+        if first is None:
+            return None
         
         # Check if first line is a title and extract it
         title = None
-        diagram_shapes = shapes
+        if first.strip().startswith('Title(') and first.strip().endswith(')'):
+            title = first.strip()[6:-1]  # Extract text between Title( and )
+        skip = 1 if title is not None else 0
         
-        if shapes and shapes[0].strip().startswith('Title(') and shapes[0].strip().endswith(')'):
-            title_line = shapes[0].strip()
-            title = title_line[6:-1]  # Extract text between Title( and )
-            diagram_shapes = shapes[1:]  # Rest of the shapes
+        def parse(shape_input):
+            # Apply default shape transformation as lines are read
+            if default_shape:
+                shape_input = apply_default_shape(shape_input)
+            return parse_line(shape_input)
         
-        if not diagram_shapes:
-            # Only title, no shapes
-            return title if title else ""
+        # Hashes of the names connections start and end at: a node in both
+        # makes the diagram a possible network
+        sources = array('q')
+        targets = set()
+        lexed = {}  # Line number (after the title) -> statement of the lines lexed here
+        line_count = 0
+        connection_lines = 0
+        invalid_lines = 0
+        for shape_input in itertools.islice(shapes, skip, None):
+            if "connects" in shape_input:
+                statement = lexed[line_count] = parse(shape_input)
+                if statement.connectors:
+                    connection_lines += 1
+                    if self._validate_statement(statement):
+                        invalid_lines += 1
+                    for source, target in self.network_system.edge_names(statement):
+                        sources.append(hash(source))
+                        targets.add(hash(target))
+            line_count += 1
+            if budget is not None:
+                budget.check_time()
         
-        # Apply default shape transformation to all shapes first
-        processed_shapes = []
-        for shape_input in diagram_shapes:
-            if default_shape:
-                shape_input = self._apply_default_shape(shape_input, default_shape)
-            processed_shapes.append(shape_input)
+        diagram = ParsedDiagram(title, LazyStatements(shapes, skip, parse, lexed), line_count, connection_lines,
+                                any(source in targets for source in sources), invalid_lines)
+        if diagram.may_be_network:
+            statements = []
+            for statement in diagram.statements:
+                statements.append(statement)
+                if budget is not None:
+                    budget.check_time()
+            diagram.statements = statements
+        return diagram
+    
+    def _iter_shapes(self, shapes, default_shape=None, memo=None):
+        """shapes may be any iterable of lines: a list or FileOperations.lazy_shapes"""
+        if self.limits is None:
+            yield from self._iter_blocks(shapes, default_shape, memo)
+            return
+        
+        try:
+            yield from self._iter_blocks(shapes, default_shape, memo, self.limits.budget())
+        except RenderLimitExceeded as e:
+            if not self.limits.degrade:
+                raise
+            # A degraded render ends with a notice in place of the rest
+            yield limit_notice(e)
+    
+    def _iter_blocks(self, shapes, default_shape=None, memo=None, budget=None):
+        render_statement = self._render_statement
+        if memo is not None:
+            render_statement = memo.wrap("render", render_statement, key=lambda statement: statement.text)
+        
+        diagram = self.parse_diagram(shapes, default_shape, memo, budget)
+        if diagram is None:
+            return
+        
+        title = diagram.title
+        if title:
+            yield title
+        
+        if not diagram.line_count:
+            # Only title, no shapes
+            return
         
         # Check if this looks like a complex network (multiple connections with shared nodes that have both incoming and outgoing)
-        connection_count = sum(1 for shape in processed_shapes if ' connects to ' in shape)
-        if connection_count > 1:
-            # Try to detect if there are nodes with both incoming and outgoing connections
-            network = self.network_system.parse_network(processed_shapes)
-            complex_nodes = [name for name, node in network['nodes'].items() 
-                           if node['incoming'] and node['outgoing']]
-            
-            if complex_nodes:
+        if diagram.may_be_network:
+            network = self.network_system.parse_statements(diagram.statements)
+            if network.central_nodes():
                 # This is a complex network, use network system
-                diagram_content = self.network_system.render_network(network)
-                if title:
-                    return title + '\n\n' + diagram_content
-                return diagram_content
-        
-        # Fall back to original per-shape rendering
-        rendered_shapes = []
-        for shape_input in processed_shapes:
-            
-            # Validate syntax first
-            syntax_error = self._validate_syntax(shape_input)
-            if syntax_error:
-                rendered_shapes.append(syntax_error)
+                if budget is not None:
+                    for statement in diagram.statements:
+                        budget.check_line(statement.text)
+                yield self.network_system.render_network(network, budget)
+                return
+        
+        # Otherwise render each line from the same statements
+        parallel = self.workers > 1 and memo is None and diagram.line_count >= MIN_PARALLEL_LINES
+        if budget is not None:
+            blocks = self._render_budgeted(diagram, render_statement, budget, parallel)
+        elif parallel:
+            blocks = self._render_parallel(diagram.statements, diagram.line_count)
+        else:
+            blocks = map(render_statement, diagram.statements)
+        rendered_any = False
+        for rendered in blocks:
+            if rendered:
+                rendered_any = True
+                yield rendered
+        
+        if title and not rendered_any:
+            # Keep the blank separator after a title with nothing drawn under it
+            yield ""
+    
+    def _render_budgeted(self, diagram, render_statement, budget, parallel=False):
+        """Render statements like the plain loop, checking the budget before each line and after its output.
+        
+        Over-long lines are never rendered, and no line is rendered once the
+        diagram has too many nodes or edges, not even by a worker.
+        """
+        lines = self._budget_lines(diagram.statements, budget)
+        if parallel:
+            blocks = self._render_parallel(lines, diagram.line_count)
+        else:
+            blocks = (line if isinstance(line, str) else render_statement(line) for line in lines)
+        for rendered in blocks:
+            budget.add_output(rendered)
+            yield rendered
+    
+    def _budget_lines(self, statements, budget):
+        """Yield each statement as it is reached, or the notice drawn in place of an over-long line"""
+        for statement in statements:
+            budget.check_time()
+            if budget.line_too_long(statement.text):
+                try:
+                    budget.check_line(statement.text)
+                except RenderLimitExceeded as e:
+                    if not budget.limits.degrade:
+                        raise
+                    yield limit_notice(e)
                 continue
-            
-            # Check if this is convergent connections first
-            convergent = self.divergent_connections.parse_convergent_connections(shape_input)
+            budget.add_graph(*statement.graph_size())
+            yield statement
+    
+    def _render_parallel(self, statements, line_count):
+        """Render statements in chunks across the worker pool, yielding blocks in their original order.
+        
+        statements may also hold blocks already drawn, which pass through. If
+        reading them raises RenderLimitExceeded, the lines before are still
+        rendered and yielded before it is raised again.
+        """
+        size = min(MAX_CHUNK_LINES, max(1, -(-line_count // (self.workers * 4))))
+        return self.pool.imap(_render_item, statements, size)
+    
+    def _render_statement(self, statement):
+        """Validate and render one lexed line, returning "" when nothing is drawn"""
+        # Validate syntax first
+        syntax_error = self._validate_statement(statement)
+        if syntax_error:
+            return syntax_error
+        
+        kind = statement.kind
+        if kind == "convergent":
+            convergent = self.divergent_connections.convergent_from_statement(statement)
             if convergent:
-                rendered_convergent = self.divergent_connections.render_convergent_connections(convergent)
-                if rendered_convergent:
-                    rendered_shapes.append(rendered_convergent)
-            else:
-                # Check if this is divergent connections  
-                divergent = self.divergent_connections.parse_divergent_connections(shape_input)
-                if divergent:
-                    rendered_divergent = self.divergent_connections.render_divergent_connections(divergent)
-                    if rendered_divergent:
-                        rendered_shapes.append(rendered_divergent)
-                else:
-                    # Check if this is a chain
-                    chain = self.chain_system.parse_chain(shape_input)
-                    if chain:
-                        rendered_chain = self.chain_system.render_chain(chain)
-                        if rendered_chain:
-                            rendered_shapes.append(rendered_chain)
-                    else:
-                        # Check if this is a single connection
-                        connection = self.connection_system.parse_connection(shape_input)
-                        if connection:
-                            rendered_connection = self.connection_system.render_connection(
-                                connection["from"], connection["to"], connection["horizontal"], 
-                                connection["label"], connection.get("arrow_type")
-                            )
-                            if rendered_connection:
-                                rendered_shapes.append(rendered_connection)
-                        else:
-                            rendered_shape = self.shape_renderer.render_single_shape(shape_input)
-                            if rendered_shape:
-                                rendered_shapes.append(rendered_shape)
-        
-        diagram_content = "\n\n".join(rendered_shapes)
-        if title:
-            return title + '\n\n' + diagram_content
-        return diagram_content
\ No newline at end of file
+                return self.divergent_connections.render_convergent_connections(convergent)
+        elif kind == "divergent":
+            divergent = self.divergent_connections.divergent_from_statement(statement)
+            if divergent:
+                return self.divergent_connections.render_divergent_connections(divergent)
+        elif kind == "chain":
+            chain = self.chain_system.chain_from_statement(statement)
+            if chain:
+                return self.chain_system.render_chain(chain)
+        elif kind == "connection":
+            connection = self.connection_system.connection_from_statement(statement)
+            if connection:
+                return self.connection_system.render_connection(
+                    connection["from"], connection["to"], connection["horizontal"], 
+                    connection["label"], connection.get("arrow_type")
+                )
+        
+        return self.shape_renderer.render_single_shape(statement.text)
@@ -1,8 +1,103 @@
+import io
+import os
+import stat
+
+
 class FileOperations:
     def read_file(self, filename):
         with open(filename, 'r') as f:
             return f.read()
     
+    def read_bytes(self, filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+    
     def parse_shapes(self, filename):
-        content = self.read_file(filename)
-        return content.strip().split('\n') if content.strip() else []
\ No newline at end of file
+        return list(self.iter_lines(filename))
+    
+    def parse_bytes(self, data):
+        """The lines parse_shapes would give for a file holding data"""
+        return list(self._iter_raw_lines(io.BytesIO(data)))
+    
+    def lazy_shapes(self, filename):
+        """Re-iterable view of parse_shapes that reads the file lazily on every pass.
+        
+        Only regular files can be read more than once, so anything else (a pipe
+        or /dev/stdin) is read into a list up front.
+        """
+        if not stat.S_ISREG(os.stat(filename).st_mode):
+            return self.parse_shapes(filename)
+        return FileLines(self, filename)
+    
+    def iter_lines(self, filename):
+        """Yield the same lines as parse_text(read_file(filename)), one at a time.
+        
+        The file is read through a buffered binary reader and each line is decoded
+        only when it is reached, so memory use follows the longest line rather than
+        the file size, and a file truncated while it is read just ends early.
+        """
+        with open(filename, 'rb') as f:
+            yield from self._iter_raw_lines(f)
+    
+    def _iter_raw_lines(self, raw_lines):
+        """Decode and trim lines read in binary, like parse_text does to text"""
+        import locale
+        
+        encoding = locale.getpreferredencoding(False)
+        # Blank lines are held back until we know they aren't trailing ones,
+        # and the latest line until we know whether it is the last
+        previous = None
+        pending_blank = []
+        for raw in raw_lines:
+            if raw.endswith(b'\n'):
+                raw = raw[:-1]
+            line = raw.decode(encoding)
+            if line.endswith('\r'):
+                line = line[:-1]
+            
+            if not line.strip():
+                if previous is not None:
+                    pending_blank.append(line)
+                continue
+            
+            if previous is None:
+                line = line.lstrip()
+            else:
+                yield previous
+                yield from pending_blank
+                pending_blank = []
+            previous = line
+        
+        if previous is not None:
+            yield previous.rstrip()
+    
+    def parse_text(self, content):
+        return content.strip().split('\n') if content.strip() else []
+    
+    def parse_lines(self, lines):
+        """Same result as parse_text on the joined lines, without building the joined string"""
+        shapes = [line[:-1] if line.endswith('\n') else line for line in lines]
+        
+        # Drop blank lines at both ends and trim the outermost lines, like str.strip()
+        start = 0
+        while start < len(shapes) and not shapes[start].strip():
+            start += 1
+        end = len(shapes)
+        while end > start and not shapes[end - 1].strip():
+            end -= 1
+        if start == end:
+            return []
+        
+        shapes = shapes[start:end]
+        shapes[0] = shapes[0].lstrip()
+        shapes[-1] = shapes[-1].rstrip()
+        return shapes
+
+
+class FileLines:
+    def __init__(self, file_operations, filename):
+        self.file_operations = file_operations
+        self.filename = filename
+    
+    def __iter__(self):
+        return self.file_operations.iter_lines(self.filename)
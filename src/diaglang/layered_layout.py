@@ -0,0 +1,382 @@
+import heapq
+from collections import namedtuple
+
+
+# boxes[i] is the (x, y, width, height) of node i; edges[i] is the polyline of
+# edge i as a list of (x, y) points from its source to its target, or None for
+# self-loops, which aren't drawn; labels[i] is the (x, y) where the label of
+# edge i starts, or None if it has no label
+Layout = namedtuple('Layout', ['boxes', 'edges', 'labels', 'width', 'height'])
+
+
+class LayeredLayout:
+    """Sugiyama-style layered layout for directed graphs, flowing left to right.
+
+    Nodes are numbered 0..n-1 and given as (width, height) sizes; edges are
+    (source, target) index pairs. layout() breaks cycles, puts every node in a
+    rank (column), reorders each rank to reduce edge crossings with a bounded
+    number of barycenter sweeps, then assigns coordinates and routes every edge
+    through the gaps between ranks. Each step is linear in the size of the
+    graph, apart from sorting within ranks.
+
+    Edge labels, given as widths, are written over a horizontal run of their
+    edge, and the gaps between ranks are widened to fit them.
+
+    A RenderBudget, if given, has its time limit checked after ranking, after
+    every sweep and after every rank is placed.
+    """
+
+    def __init__(self, max_sweeps=4, row_gap=1, min_gap=6):
+        self.max_sweeps = max_sweeps
+        self.row_gap = row_gap  # Blank rows between nodes in a rank
+        self.min_gap = min_gap  # Columns between ranks
+
+    def layout(self, sizes, edges, label_widths=None, budget=None):
+        node_count = len(sizes)
+        flipped = self._break_cycles(node_count, edges)
+        ranks = self._assign_ranks(node_count, edges, flipped)
+        if budget is not None:
+            budget.check_time()
+
+        # Edges spanning several ranks get a dummy node in each rank they cross
+        widths = [width for width, height in sizes]
+        heights = [height for width, height in sizes]
+        layers = [[] for _ in range(max(ranks, default=-1) + 1)]
+        for node in range(node_count):
+            layers[ranks[node]].append(node)
+        up = [[] for _ in range(node_count)]
+        down = [[] for _ in range(node_count)]
+        paths = []
+        for index, (source, target) in enumerate(edges):
+            if source == target:
+                paths.append(None)
+                continue
+            if index in flipped:
+                source, target = target, source
+            path = [source]
+            for rank in range(ranks[source] + 1, ranks[target]):
+                dummy = len(widths)
+                widths.append(0)
+                heights.append(1)
+                ranks.append(rank)
+                up.append([])
+                down.append([])
+                layers[rank].append(dummy)
+                path.append(dummy)
+            path.append(target)
+            for a, b in zip(path, path[1:]):
+                down[a].append(b)
+                up[b].append(a)
+            paths.append(path)
+
+        # A label goes on the run leaving its source when no other edge shares it,
+        # otherwise on the run entering its target; either way the gap must fit it
+        leads = [2] * len(layers)  # Columns before a gap's first channel
+        tails = [1] * len(layers)  # Columns after a gap's last channel
+        placements = [None] * len(edges)
+        for index, path in enumerate(paths):
+            label_width = label_widths[index] if label_widths else 0
+            if path is None or not label_width:
+                continue
+            if len(down[path[0]]) == 1:
+                rank = ranks[path[0]]
+                leads[rank] = max(leads[rank], label_width + 2)
+                placements[index] = (path[0], path[1], True)
+            else:
+                rank = ranks[path[-2]]
+                tails[rank] = max(tails[rank], label_width + 1)
+                placements[index] = (path[-2], path[-1], False)
+
+        self._order_layers(layers, up, down, budget)
+        x, y, channels = self._place(layers, node_count, widths, heights, up, down, leads, tails, budget)
+
+        def mid(node):
+            return y[node] + heights[node] // 2
+
+        polylines = []
+        for index, path in enumerate(paths):
+            if path is None:
+                polylines.append(None)
+                continue
+            points = []
+            for a, b in zip(path, path[1:]):
+                points.append((x[a] + widths[a], mid(a)))
+                if mid(a) != mid(b):
+                    channel = channels[a]
+                    points.append((channel, mid(a)))
+                    points.append((channel, mid(b)))
+                points.append((x[b] - 1, mid(b)))
+            points = _drop_collinear(points)
+            if index in flipped:
+                points.reverse()
+            polylines.append(points)
+
+        labels = []
+        for index, placement in enumerate(placements):
+            if placement is None:
+                labels.append(None)
+            elif placement[2]:
+                a = placement[0]
+                labels.append((x[a] + widths[a] + 1, mid(a)))
+            else:
+                b = placement[1]
+                labels.append((x[b] - 1 - label_widths[index], mid(b)))
+
+        boxes = [(x[node], y[node], widths[node], heights[node]) for node in range(node_count)]
+        width = max((x[node] + widths[node] for node in range(len(widths))), default=0)
+        height = max((y[node] + heights[node] for node in range(len(widths))), default=0)
+        return Layout(boxes, polylines, labels, width, height)
+
+    def _break_cycles(self, node_count, edges):
+        """Return the indexes of edges to reverse so the graph has no cycles (DFS back edges)"""
+        outgoing = [[] for _ in range(node_count)]
+        for index, (source, target) in enumerate(edges):
+            if source != target:
+                outgoing[source].append((target, index))
+
+        flipped = set()
+        state = [0] * node_count  # 0 unvisited, 1 on the DFS stack, 2 done
+        for root in range(node_count):
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [(root, iter(outgoing[root]))]
+            while stack:
+                node, remaining = stack[-1]
+                for target, index in remaining:
+                    if state[target] == 1:
+                        flipped.add(index)
+                    elif state[target] == 0:
+                        state[target] = 1
+                        stack.append((target, iter(outgoing[target])))
+                        break
+                else:
+                    state[node] = 2
+                    stack.pop()
+        return flipped
+
+    def _assign_ranks(self, node_count, edges, flipped):
+        """Longest-path ranking, then balance each node between its neighbours"""
+        successors = [[] for _ in range(node_count)]
+        in_degree = [0] * node_count
+        for index, (source, target) in enumerate(edges):
+            if source == target:
+                continue
+            if index in flipped:
+                source, target = target, source
+            successors[source].append(target)
+            in_degree[target] += 1
+
+        predecessors = [[] for _ in range(node_count)]
+        for source in range(node_count):
+            for target in successors[source]:
+                predecessors[target].append(source)
+
+        ranks = [0] * node_count
+        topological = [node for node in range(node_count) if not in_degree[node]]
+        for node in topological:
+            for target in successors[node]:
+                ranks[target] = max(ranks[target], ranks[node] + 1)
+                in_degree[target] -= 1
+                if not in_degree[target]:
+                    topological.append(target)
+
+        # Longest-path ranks stretch many edges; move each node (last first) to the
+        # rank between its neighbours that keeps its edges shortest
+        for node in reversed(topological):
+            if not successors[node]:
+                continue
+            low = max((ranks[other] + 1 for other in predecessors[node]), default=0)
+            high = min(ranks[other] for other in successors[node]) - 1
+            wanted = sorted([ranks[other] + 1 for other in predecessors[node]] +
+                            [ranks[other] - 1 for other in successors[node]])
+            ranks[node] = min(max(wanted[(len(wanted) - 1) // 2], low), high)
+        return ranks
+
+    def _order_layers(self, layers, up, down, budget=None):
+        """Reorder ranks by the barycenter of their neighbours, sweeping right then left"""
+        position = [0] * len(up)
+        for layer in layers:
+            for index, node in enumerate(layer):
+                position[node] = index
+
+        for _ in range(self.max_sweeps):
+            changed = False
+            for layer in layers[1:]:
+                changed |= self._reorder(layer, up, position)
+            for layer in reversed(layers[:-1]):
+                changed |= self._reorder(layer, down, position)
+            if budget is not None:
+                budget.check_time()
+            if not changed:
+                break
+
+    def _reorder(self, layer, neighbours, position):
+        keys = []
+        for node in layer:
+            adjacent = neighbours[node]
+            if len(adjacent) == 1:
+                barycenter = position[adjacent[0]]
+            elif adjacent:
+                barycenter = sum([position[other] for other in adjacent]) / len(adjacent)
+            else:
+                barycenter = position[node]
+            keys.append((barycenter, position[node], node))
+        keys.sort()
+
+        changed = False
+        for index, key in enumerate(keys):
+            node = key[2]
+            if layer[index] != node:
+                layer[index] = node
+                position[node] = index
+                changed = True
+        return changed
+
+    def _place(self, layers, node_count, widths, heights, up, down, leads, tails, budget=None):
+        """Assign x by rank and y by order, and pick a routing channel for each node's edges"""
+        x = [0] * len(widths)
+        y = [0] * len(widths)
+        channels = [0] * len(widths)
+
+        # Every rank fits in the rows of the tallest rank packed tight, so y can't
+        # drift down from rank to rank: each node keeps between the rows its rank
+        # needs above it (low) and below it (high)
+        low = [0] * len(widths)
+        high = [0] * len(widths)
+        extents = []
+        for layer in layers:
+            cursor = 0
+            for node in layer:
+                low[node] = cursor
+                cursor += heights[node] + self.row_gap
+            extents.append(cursor)
+        height = max(extents, default=0)
+        for layer in layers:
+            limit = height
+            for node in reversed(layer):
+                high[node] = limit = limit - heights[node] - self.row_gap
+                y[node] = (low[node] + high[node]) // 2
+
+        # Line nodes up with their predecessors, then with their successors
+        for layer in layers[1:]:
+            self._align(layer, up, y, heights, low, high)
+            if budget is not None:
+                budget.check_time()
+        for layer in reversed(layers[:-1]):
+            self._align(layer, down, y, heights, low, high)
+            if budget is not None:
+                budget.check_time()
+
+        column_x = 0
+        for rank, layer in enumerate(layers):
+            column_width = max([widths[node] for node in layer] + [1])
+            for node in layer:
+                x[node] = column_x
+                if node >= node_count:
+                    # Dummy nodes carry their edge straight across the column
+                    widths[node] = column_width
+            column_x += column_width
+
+            if rank + 1 < len(layers):
+                channel_count = self._assign_channels(layer, y, heights, down, column_x + leads[rank], channels)
+                column_x += max(self.min_gap, leads[rank] + 2 * channel_count + tails[rank])
+            if budget is not None:
+                budget.check_time()
+        return x, y, channels
+
+    def _align(self, layer, neighbours, y, heights, low, high):
+        """Move a rank's nodes towards the centre of their neighbours, keeping order and gaps.
+
+        The rank is packed towards those rows once from the top and once from the
+        bottom, and each node is put midway between the two, so nodes that want
+        the same rows share the difference instead of pushing the rest aside.
+        """
+        wanted = []
+        for node in layer:
+            if neighbours[node]:
+                centre = sum(y[other] + heights[other] // 2 for other in neighbours[node]) // len(neighbours[node])
+                wanted.append(min(max(centre - heights[node] // 2, low[node]), high[node]))
+            else:
+                wanted.append(y[node])
+
+        from_top = []
+        cursor = 0
+        for node, row in zip(layer, wanted):
+            cursor = max(cursor, row)
+            from_top.append(cursor)
+            cursor += heights[node] + self.row_gap
+        limit = None
+        for index in range(len(layer) - 1, -1, -1):
+            node = layer[index]
+            row = wanted[index]
+            if limit is not None:
+                row = min(row, limit - heights[node] - self.row_gap)
+            y[node] = (from_top[index] + row) // 2
+            limit = row
+
+    def _assign_channels(self, layer, y, heights, down, first_x, channels):
+        """Give each node whose edges change rows a vertical channel in the following gap.
+
+        Channels are reused by nodes whose vertical runs don't overlap (greedy
+        interval colouring), which keeps gaps narrow.
+        """
+        runs = []
+        for node in layer:
+            start = y[node] + heights[node] // 2
+            ends = [y[target] + heights[target] // 2 for target in down[node]]
+            ends = [end for end in ends if end != start]
+            if ends:
+                runs.append((min(ends + [start]), max(ends + [start]), node))
+        runs.sort()
+
+        busy = []  # (last row, channel) of channels in use
+        channel_count = 0
+        for low, high, node in runs:
+            if busy and busy[0][0] + 1 < low:
+                channel = heapq.heappop(busy)[1]
+            else:
+                channel = channel_count
+                channel_count += 1
+            heapq.heappush(busy, (high, channel))
+            channels[node] = first_x + 2 * channel
+        return channel_count
+
+
+def _drop_collinear(points):
+    result = []
+    for point in points:
+        if result and point == result[-1]:
+            continue
+        if len(result) >= 2:
+            (x1, y1), (x2, y2) = result[-2], result[-1]
+            if (x1 == x2 == point[0]) or (y1 == y2 == point[1]):
+                result[-1] = point
+                continue
+        result.append(point)
+    return result
+
+
+def stack_layouts(parts, node_count, edge_count, gap=1):
+    """Stack independent layouts top to bottom into one Layout.
+
+    parts is a list of (nodes, edges, layout): the layout of a subgraph whose
+    node i is nodes[i] and edge i is edges[i] in the combined graph. Each
+    layout starts gap blank rows below the one before it.
+    """
+    boxes = [None] * node_count
+    polylines = [None] * edge_count
+    labels = [None] * edge_count
+    width = 0
+    top = 0
+    for nodes, edges, layout in parts:
+        for node, (x, y, node_width, node_height) in zip(nodes, layout.boxes):
+            boxes[node] = (x, y + top, node_width, node_height)
+        for edge, points, label in zip(edges, layout.edges, layout.labels):
+            if points:
+                polylines[edge] = [(x, y + top) for x, y in points]
+            if label:
+                labels[edge] = (label[0], label[1] + top)
+        width = max(width, layout.width)
+        top += layout.height + gap
+    return Layout(boxes, polylines, labels, width, max(0, top - gap))
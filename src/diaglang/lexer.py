@@ -0,0 +1,259 @@
+import string
+
+ARROW_TYPES = ("point to", "point back", "double point")
+
+CONNECTOR = " connects to"
+AND = " and "
+DIRECTIONS = (("horizontal", True), ("vertical", False))
+
+# Bare labels start with a letter or underscore and go on with letters, digits,
+# underscores and whitespace
+LABEL_START = frozenset(string.ascii_letters + "_")
+LABEL_CHARS = LABEL_START | frozenset(string.digits)
+
+
+class ShapeRef:
+    """A shape reference such as Rectangle(Label), or a bare shape name"""
+
+    def __init__(self, text):
+        self.text = text
+        if '(' in text and text.endswith(')'):
+            self.shape_type = text.split('(')[0].lower()
+            self.label = text.split('(')[1][:-1]
+        else:
+            self.shape_type = text.lower()
+            self.label = None
+
+    def __repr__(self):
+        return f"ShapeRef({self.text!r})"
+
+
+class Connector:
+    """A 'connects to[(label[, arrow])] direction' clause between two shape groups"""
+
+    def __init__(self, raw=None, horizontal=None):
+        # raw is the text inside the parentheses, None when there were none
+        self.raw = raw
+        self.horizontal = horizontal
+        self.label = None
+        self.arrow_type = None
+        self.invalid_arrow = None
+
+        if raw is None:
+            return
+
+        # Content is either "label", "arrow type" or "label, arrow type"
+        if "," in raw:
+            parts = raw.split(",", 1)
+            self.label = parts[0].strip()
+            potential_arrow_type = parts[1].strip()
+            if potential_arrow_type in ARROW_TYPES:
+                self.arrow_type = potential_arrow_type
+            elif parts[0] and potential_arrow_type:
+                self.invalid_arrow = potential_arrow_type
+        elif raw in ARROW_TYPES:
+            self.arrow_type = raw
+        else:
+            self.label = raw
+            # Anything that reads like an arrow type but isn't one is an error
+            stripped = raw.strip()
+            if stripped and (" arrow" in stripped or "point" in stripped) and stripped not in ARROW_TYPES:
+                self.invalid_arrow = stripped
+
+    def __repr__(self):
+        return f"Connector(raw={self.raw!r}, horizontal={self.horizontal!r})"
+
+
+class Statement:
+    """One parsed line: shape groups joined by connectors.
+
+    groups[i] is the list of shapes (split on 'and') on either side of
+    connectors[i], so connectors[i] links groups[i] to groups[i + 1].
+    """
+
+    def __init__(self, text, groups, connectors):
+        self.text = text
+        self.groups = groups
+        self.connectors = connectors
+
+    @property
+    def kind(self):
+        if not self.connectors:
+            return "shape"
+        if len(self.connectors) > 1:
+            return "chain"
+        if len(self.groups[0]) > 1:
+            return "convergent"
+        if len(self.groups[1]) > 1:
+            return "divergent"
+        return "connection"
+
+    def graph_size(self):
+        """(shapes, connections) drawn for this line: each connector joins every shape on either side"""
+        edges = sum(len(before) * len(after) for before, after in zip(self.groups, self.groups[1:]))
+        return sum(len(group) for group in self.groups), edges
+
+    def group_text(self, index):
+        return " and ".join(shape.text for shape in self.groups[index])
+
+    def __repr__(self):
+        return f"Statement({self.text!r})"
+
+
+def make_connection(from_shape, to_shape, connector):
+    """Build the connection dict the renderers consume"""
+    return {
+        "from": from_shape,
+        "to": to_shape,
+        "horizontal": connector.horizontal,
+        "label": connector.label,
+        "arrow_type": connector.arrow_type
+    }
+
+
+class Lexer:
+    def parse_line(self, line):
+        """Scan a line once, left to right, into a Statement"""
+        start = line.find(CONNECTOR)
+        if start == -1:
+            return Statement(line, [[ShapeRef(line)]], [])
+
+        groups = [self._parse_group(line[:start])]
+        connectors = []
+
+        while start != -1:
+            segment_start = start + len(CONNECTOR)
+            start = line.find(CONNECTOR, segment_start)
+            segment = line[segment_start:] if start == -1 else line[segment_start:start]
+            connector, shapes_text = self._parse_connector(segment)
+            connectors.append(connector)
+            groups.append(self._parse_group(shapes_text))
+
+        return Statement(line, groups, connectors)
+
+    def parse_lines(self, lines):
+        return [self.parse_line(line) for line in lines]
+
+    def apply_default_shape(self, line, default_shape):
+        """Wrap the bare labels in a line as Default_shape(label).
+
+        A bare label is rewritten where it is the source of the first
+        connection, the target after the last direction keyword, a single word
+        after 'and', or the whole line. Each rule is one left-to-right scan
+        with no backtracking, so a line is rewritten in linear time.
+        """
+        shape = default_shape.capitalize()
+        line = _wrap_source(line, shape)
+        line = _wrap_target(line, shape)
+        line = _wrap_and_words(line, shape)
+        if CONNECTOR not in line and not any(char in "(){}" for char in line):
+            # It's likely a standalone label
+            label = line.strip()
+            if label and label[0] in LABEL_START and all(_is_label_char(char) for char in label):
+                line = f"{shape}({label})"
+        return line
+
+    def _parse_connector(self, segment):
+        rest = segment.strip()
+
+        raw = None
+        if rest.startswith("(") and ")" in rest:
+            end_paren = rest.find(")")
+            raw = rest[1:end_paren]
+            rest = rest[end_paren + 1:].strip()
+
+        horizontal = None
+        for keyword, is_horizontal in DIRECTIONS:
+            if rest == keyword or rest.startswith(keyword + " "):
+                horizontal = is_horizontal
+                rest = rest[len(keyword):].strip()
+                break
+
+        return Connector(raw, horizontal), rest
+
+    def _parse_group(self, text):
+        text = text.strip()
+        if AND not in text:
+            return [ShapeRef(text)]
+        shapes = [ShapeRef(part.strip()) for part in text.split(AND)]
+        return [shape for shape in shapes if shape.text]
+
+
+def _is_label_char(char):
+    return char in LABEL_CHARS or char.isspace()
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+def _skip_spaces(line, index):
+    while index < len(line) and line[index].isspace():
+        index += 1
+    return index
+
+
+def _wrap_source(line, shape):
+    """'label connects to ...' -> 'Shape(label) connects to ...' when the line starts with a bare label"""
+    if not line or line[0] not in LABEL_START:
+        return line
+    index = 1
+    while index < len(line):
+        if line[index].isspace():
+            # The label may end before any whitespace that is followed by 'connects to'
+            words = _skip_spaces(line, index)
+            if line.startswith("connects", words):
+                to = _skip_spaces(line, words + 8)
+                if to > words + 8 and line.startswith("to", to):
+                    return f"{shape}({line[:index].strip()}) connects to{line[to + 2:]}"
+            index = words
+        elif line[index] in LABEL_CHARS:
+            index += 1
+        else:
+            break
+    return line
+
+
+def _wrap_target(line, shape):
+    """'... horizontal label' -> '... horizontal Shape(label)' when the line ends with a bare label"""
+    end = len(line) - 1 if line.endswith("\n") else len(line)
+    last_bad = -1  # Index of the last character a label can't contain
+    candidates = []  # (keyword start, keyword, label start)
+    for index in range(end):
+        char = line[index]
+        if not _is_label_char(char):
+            last_bad = index
+        elif char in "hv" and (index == 0 or not _is_word_char(line[index - 1])):
+            for keyword, _ in DIRECTIONS:
+                if line.startswith(keyword, index):
+                    label = _skip_spaces(line, index + len(keyword))
+                    if label > index + len(keyword) and label < end and line[label] in LABEL_START:
+                        candidates.append((index, keyword, label))
+    # The leftmost keyword whose label runs to the end of the line wins
+    for index, keyword, label in candidates:
+        if label > last_bad:
+            return f"{line[:index]}{keyword} {shape}({line[label:end].strip()}){line[end:]}"
+    return line
+
+
+def _wrap_and_words(line, shape):
+    """'... and word ...' -> '... and Shape(word) ...' for every bare word after 'and'"""
+    parts = []
+    copied = 0
+    index = line.find("and")
+    while index != -1:
+        word = _skip_spaces(line, index + 3)
+        if ((index == 0 or not _is_word_char(line[index - 1]))
+                and word > index + 3 and word < len(line) and line[word] in LABEL_START):
+            end = word + 1
+            while end < len(line) and line[end] in LABEL_CHARS:
+                end += 1
+            if end == len(line) or line[end].isspace():
+                parts.append(line[copied:index])
+                parts.append(f"and {shape}({line[word:end]})")
+                copied = end
+                index = line.find("and", end)
+                continue
+        index = line.find("and", index + 1)
+    parts.append(line[copied:])
+    return "".join(parts)
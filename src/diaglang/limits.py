@@ -0,0 +1,93 @@
+import time
+
+
+class RenderLimitExceeded(Exception):
+    """A render went over one of its RenderLimits.
+
+    limit names the limit ('line_length', 'nodes', 'edges', 'output_cells' or
+    'seconds'), value is how far the render got and maximum is the limit.
+    """
+
+    def __init__(self, limit, value, maximum):
+        # The arguments are kept as args so the error pickles, e.g. out of a process pool
+        super().__init__(limit, value, maximum)
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+
+    def __str__(self):
+        return f"{self.limit} {self.value} is over the limit of {self.maximum}"
+
+    def to_dict(self):
+        return {'limit': self.limit, 'value': self.value, 'maximum': self.maximum}
+
+
+class RenderLimits:
+    """Caps on the work one render may do, for rendering untrusted input.
+
+    Every limit defaults to None, meaning unlimited. Output cells are the
+    characters written, not counting newlines. Going over a limit raises
+    RenderLimitExceeded, unless degrade is set: then an over-long line is drawn
+    as a LIMIT EXCEEDED notice, and any other limit replaces the rest of the
+    render with one.
+    """
+
+    def __init__(self, max_line_length=None, max_nodes=None, max_edges=None,
+                 max_output_cells=None, max_seconds=None, degrade=False):
+        self.max_line_length = max_line_length
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.max_output_cells = max_output_cells
+        self.max_seconds = max_seconds
+        self.degrade = degrade
+
+    def budget(self):
+        """Start the budget of a new render"""
+        return RenderBudget(self)
+
+
+class RenderBudget:
+    """What one render has used of its RenderLimits, checked cooperatively as it goes"""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.started = time.monotonic()
+        self.nodes = 0
+        self.edges = 0
+        self.output_cells = 0
+
+    def check_time(self):
+        elapsed = time.monotonic() - self.started
+        if self.limits.max_seconds is not None and elapsed > self.limits.max_seconds:
+            raise RenderLimitExceeded('seconds', round(elapsed, 3), self.limits.max_seconds)
+
+    def line_too_long(self, line):
+        return self.limits.max_line_length is not None and len(line) > self.limits.max_line_length
+
+    def check_line(self, line):
+        _check('line_length', len(line), self.limits.max_line_length)
+
+    def add_graph(self, nodes, edges):
+        """Count nodes and edges about to be drawn"""
+        self.nodes += nodes
+        self.edges += edges
+        _check('nodes', self.nodes, self.limits.max_nodes)
+        _check('edges', self.edges, self.limits.max_edges)
+
+    def check_output(self, cells):
+        """Check that cells more output cells would still fit, without counting them"""
+        _check('output_cells', self.output_cells + cells, self.limits.max_output_cells)
+
+    def add_output(self, text):
+        self.output_cells += len(text) - text.count('\n')
+        _check('output_cells', self.output_cells, self.limits.max_output_cells)
+
+
+def limit_notice(error):
+    """The block drawn in place of whatever went over a limit in a degraded render"""
+    return f"LIMIT EXCEEDED: {error}"
+
+
+def _check(limit, value, maximum):
+    if maximum is not None and value > maximum:
+        raise RenderLimitExceeded(limit, value, maximum)
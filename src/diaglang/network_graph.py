@@ -0,0 +1,208 @@
+from array import array
+from collections.abc import Mapping, Sequence
+
+
+class NetworkGraph:
+    """A network of shapes stored as flat arrays.
+
+    Nodes are interned to integer ids in the order they are first seen, with
+    their name, shape and label kept in parallel lists. Edges are parallel
+    array('i') columns of source, target and connector ids; connector text
+    (the raw "connects to(...)" contents) and direction are interned too.
+    Adjacency is built on demand in CSR form: for node i, the ids of its
+    outgoing edges are out_edges[out_offsets[i]:out_offsets[i + 1]], so degree
+    queries are O(1).
+
+    graph['nodes'] and graph['connections'] give the dict-based view older
+    code expects, built lazily from the arrays.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.shapes = []
+        self.labels = []
+        self.ids = {}  # name -> node id
+        self.edge_sources = array('i')
+        self.edge_targets = array('i')
+        self.edge_connectors = array('i')  # index into connectors
+        self.connectors = []  # distinct (raw text, horizontal) pairs
+        self._connector_ids = {}
+        self._adjacency = None
+
+    @property
+    def node_count(self):
+        return len(self.names)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_sources)
+
+    def add_node(self, name, shape, label):
+        """Return the id of the named node, adding it if it is new (the first description wins)"""
+        node = self.ids.get(name)
+        if node is None:
+            node = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.shapes.append(shape)
+            self.labels.append(label)
+        return node
+
+    def add_edge(self, source, target, label=None, horizontal=True):
+        connector = (label, horizontal)
+        connector_id = self._connector_ids.get(connector)
+        if connector_id is None:
+            connector_id = self._connector_ids[connector] = len(self.connectors)
+            self.connectors.append(connector)
+        self.edge_sources.append(source)
+        self.edge_targets.append(target)
+        self.edge_connectors.append(connector_id)
+        self._adjacency = None
+        return len(self.edge_sources) - 1
+
+    def edge_label(self, edge):
+        return self.connectors[self.edge_connectors[edge]][0]
+
+    def edge_horizontal(self, edge):
+        return self.connectors[self.edge_connectors[edge]][1]
+
+    def _csr(self):
+        if self._adjacency is None:
+            self._adjacency = (_build_csr(self.node_count, self.edge_sources),
+                               _build_csr(self.node_count, self.edge_targets))
+        return self._adjacency
+
+    def out_degree(self, node):
+        offsets = self._csr()[0][0]
+        return offsets[node + 1] - offsets[node]
+
+    def in_degree(self, node):
+        offsets = self._csr()[1][0]
+        return offsets[node + 1] - offsets[node]
+
+    def out_edges(self, node):
+        offsets, edges = self._csr()[0]
+        return edges[offsets[node]:offsets[node + 1]]
+
+    def in_edges(self, node):
+        offsets, edges = self._csr()[1]
+        return edges[offsets[node]:offsets[node + 1]]
+
+    def central_nodes(self):
+        """Ids of nodes with both incoming and outgoing edges, without building the adjacency"""
+        has_outgoing = bytearray(self.node_count)
+        has_incoming = bytearray(self.node_count)
+        for node in self.edge_sources:
+            has_outgoing[node] = 1
+        for node in self.edge_targets:
+            has_incoming[node] = 1
+        return [node for node, (outgoing, incoming) in enumerate(zip(has_outgoing, has_incoming))
+                if outgoing and incoming]
+
+    def components(self):
+        """Split the graph into weakly connected components with union-find.
+
+        Returns (nodes, edges) id lists per component, ordered by their first
+        node, with ids in increasing order inside each component.
+        """
+        parent = array('i', range(self.node_count))
+        size = array('i', [1]) * self.node_count
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]  # Path halving
+                node = parent[node]
+            return node
+
+        for source, target in zip(self.edge_sources, self.edge_targets):
+            a, b = find(source), find(target)
+            if a != b:
+                if size[a] < size[b]:
+                    a, b = b, a
+                parent[b] = a
+                size[a] += size[b]
+
+        index = {}  # root -> component number
+        components = []
+        for node in range(self.node_count):
+            root = find(node)
+            if root not in index:
+                index[root] = len(components)
+                components.append(([], []))
+            components[index[root]][0].append(node)
+        for edge, source in enumerate(self.edge_sources):
+            components[index[find(source)]][1].append(edge)
+        return components
+
+    # Dict-based compatibility view
+
+    def __getitem__(self, key):
+        if key == 'nodes':
+            return NodesView(self)
+        if key == 'connections':
+            return ConnectionsView(self)
+        raise KeyError(key)
+
+    def node_ref(self, node):
+        return {'shape': self.shapes[node], 'label': self.labels[node], 'name': self.names[node]}
+
+    def connection(self, edge):
+        label, horizontal = self.connectors[self.edge_connectors[edge]]
+        return {
+            'source': self.node_ref(self.edge_sources[edge]),
+            'target': self.node_ref(self.edge_targets[edge]),
+            'label': label,
+            'direction': 'horizontal' if horizontal else 'vertical'
+        }
+
+
+def _build_csr(node_count, endpoints):
+    """Group edge ids by the node at the given end (a counting sort), keeping edge order"""
+    offsets = array('i', bytes(4 * (node_count + 1)))
+    for node in endpoints:
+        offsets[node + 1] += 1
+    for node in range(node_count):
+        offsets[node + 1] += offsets[node]
+    edges = array('i', bytes(4 * len(endpoints)))
+    fill = array('i', offsets)
+    for edge, node in enumerate(endpoints):
+        edges[fill[node]] = edge
+        fill[node] += 1
+    return offsets, edges
+
+
+class NodesView(Mapping):
+    """name -> {'shape', 'label', 'incoming', 'outgoing'}, as parse_network used to return"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, name):
+        graph = self.graph
+        node = graph.ids[name]
+        return {
+            'shape': graph.shapes[node],
+            'label': graph.labels[node],
+            'incoming': [graph.connection(edge) for edge in graph.in_edges(node)],
+            'outgoing': [graph.connection(edge) for edge in graph.out_edges(node)]
+        }
+
+    def __iter__(self):
+        return iter(self.graph.names)
+
+    def __len__(self):
+        return self.graph.node_count
+
+
+class ConnectionsView(Sequence):
+    """The connection dicts, in input order"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.graph.connection(edge) for edge in range(self.graph.edge_count)[index]]
+        return self.graph.connection(range(self.graph.edge_count)[index])
+
+    def __len__(self):
+        return self.graph.edge_count
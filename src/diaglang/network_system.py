@@ -1,236 +1,226 @@
+from .canvas import Canvas
+from .layered_layout import LayeredLayout, stack_layouts
+from .network_graph import NetworkGraph
+from .lexer import Connector, Lexer, ShapeRef
+from .scene import Box, Label, Scene, ScenePainter, Wire
+from .worker_pool import WorkerPool
+
+
 class NetworkSystem:
-    def __init__(self, shape_renderer, connection_system):
+    def __init__(self, shape_renderer, connection_system, lexer=None, canvas_class=None, layout=None, workers=1,
+                 pool=None):
         self.shape_renderer = shape_renderer
         self.connection_system = connection_system
+        self.lexer = lexer or Lexer()
+        self.canvas_class = canvas_class or Canvas
+        self.layout = layout or LayeredLayout()
+        self.workers = workers  # Processes laying out components in parallel
+        if pool is None and workers > 1:
+            pool = WorkerPool(workers)
+        self.pool = pool  # Shared with the DiagramRenderer that owns this system
+        self.painter = ScenePainter(self.shape_renderer, self.canvas_class)
     
     def parse_network(self, lines):
         """Parse all connection lines and build a network graph"""
-        network = {
-            'nodes': {},  # node_name -> node_info
-            'connections': []  # list of connection info
-        }
+        return self.parse_statements(self.lexer.parse_lines(lines))
+    
+    def parse_statements(self, statements):
+        """Build a NetworkGraph from already lexed statements"""
+        network = NetworkGraph()
         
-        for line in lines:
-            line = line.strip()
+        for statement in statements:
+            line = statement.text.strip()
             if not line:
                 continue
                 
             # Check if this is a connection line
-            if ' connects to ' in line:
-                connection_info = self._parse_connection_line(line)
-                if connection_info:
-                    # Add nodes to network
-                    source = connection_info['source']
-                    target = connection_info['target']
-                    
-                    if source['name'] not in network['nodes']:
-                        network['nodes'][source['name']] = {
-                            'shape': source['shape'],
-                            'label': source['label'],
-                            'incoming': [],
-                            'outgoing': []
-                        }
-                    
-                    if target['name'] not in network['nodes']:
-                        network['nodes'][target['name']] = {
-                            'shape': target['shape'], 
-                            'label': target['label'],
-                            'incoming': [],
-                            'outgoing': []
-                        }
-                    
-                    # Add connection
-                    network['connections'].append(connection_info)
-                    network['nodes'][source['name']]['outgoing'].append(connection_info)
-                    network['nodes'][target['name']]['incoming'].append(connection_info)
+            if statement.connectors:
+                for source, target, connector in self._hops(statement):
+                    source_id = network.add_node(*self._node_key(source))
+                    target_id = network.add_node(*self._node_key(target))
+                    network.add_edge(source_id, target_id, connector.raw, connector.horizontal)
             else:
                 # Single shape
-                shape_info = self._parse_single_shape(line)
-                if shape_info and shape_info['name'] not in network['nodes']:
-                    network['nodes'][shape_info['name']] = {
-                        'shape': shape_info['shape'],
-                        'label': shape_info['label'],
-                        'incoming': [],
-                        'outgoing': []
-                    }
+                network.add_node(*self._node_key(ShapeRef(line)))
         
         return network
     
-    def _parse_connection_line(self, line):
-        """Parse a single connection line"""
-        import re
-        
-        # Basic pattern: Source connects to [label] direction Target
-        pattern = r'(\w+(?:\([^)]*\))?)\s+connects\s+to(?:\(([^)]*)\))?\s+(horizontal|vertical)\s+(\w+(?:\([^)]*\))?)'
-        match = re.match(pattern, line)
-        
-        if not match:
-            return None
-            
-        source_str, label, direction, target_str = match.groups()
-        
-        return {
-            'source': self._parse_shape_ref(source_str),
-            'target': self._parse_shape_ref(target_str),
-            'label': label,
-            'direction': direction
-        }
+    def _hops(self, statement):
+        """Yield every (source, target, connector) hop of a lexed connection line.
+        
+        Each connector joins every shape before it to every shape after it, so
+        chains, fan-outs and fan-ins give one hop per connection they draw.
+        Connectors without a direction join nothing.
+        """
+        for before, connector, after in zip(statement.groups, statement.connectors, statement.groups[1:]):
+            if connector.horizontal is None:
+                continue
+            for source in before:
+                for target in after:
+                    if target.text:
+                        yield source, target, connector
     
-    def _parse_shape_ref(self, shape_str):
-        """Parse a shape reference like Rectangle(label) or just label"""
-        if '(' in shape_str and shape_str.endswith(')'):
-            shape_type = shape_str.split('(')[0].lower()
-            label = shape_str.split('(')[1][:-1]
-            name = label if label else shape_type
-        else:
-            shape_type = 'rectangle'  # default
-            label = shape_str
-            name = shape_str
-            
+    def edge_names(self, statement):
+        """Yield the (source, target) node names of every edge a connection line adds"""
+        for source, target, connector in self._hops(statement):
+            yield self._node_key(source)[0], self._node_key(target)[0]
+    
+    def _node_key(self, shape):
+        """Describe a lexed shape as a network node (name, shape, label): Rectangle(label) or just label"""
+        if shape.label is not None:
+            return (shape.label if shape.label else shape.shape_type), shape.shape_type, shape.label
+        return shape.text, 'rectangle', shape.text  # default shape
+    
+    def _node_ref(self, shape):
+        name, shape_type, label = self._node_key(shape)
         return {
             'shape': shape_type,
             'label': label,
             'name': name
         }
     
+    def _parse_shape_ref(self, shape_str):
+        """Parse a shape reference like Rectangle(label) or just label"""
+        return self._node_ref(ShapeRef(shape_str))
+    
     def _parse_single_shape(self, line):
         """Parse a single shape line"""
         return self._parse_shape_ref(line)
     
-    def render_network(self, network):
-        """Render a complete network with proper layout"""
-        if not network['nodes']:
+    def render_network(self, network, budget=None):
+        """Render a complete network (a NetworkGraph) with proper layout.
+        
+        A RenderBudget, if given, is checked before the network is laid out,
+        while it is laid out, again before anything is painted and after painting.
+        """
+        if not network.node_count:
             return ""
-            
-        # For now, implement a simple layout strategy
-        # TODO: Implement more sophisticated layout algorithms
+        if budget is not None:
+            budget.add_graph(network.node_count, network.edge_count)
         
         # If there are no connections, render individual shapes
-        if not network['connections']:
-            results = []
-            for node_name, node_info in network['nodes'].items():
-                shape_input = f"{node_info['shape'].capitalize()}({node_info['label']})"
-                rendered = self.shape_renderer.render_single_shape(shape_input)
-                results.append(rendered)
-            return "\n\n".join(results)
-        
-        # For complex networks, use a grid-based layout approach
-        return self._render_complex_network(network)
-    
-    def _render_complex_network(self, network):
-        """Render complex network with multiple connections"""
-        # Identify node types
-        central_nodes = []
-        input_nodes = []
-        output_nodes = []
-        
-        for name, node in network['nodes'].items():
-            if node['incoming'] and node['outgoing']:
-                central_nodes.append(name)
-            elif not node['incoming'] and node['outgoing']:
-                input_nodes.append(name)
-            elif node['incoming'] and not node['outgoing']:
-                output_nodes.append(name)
-        
-        if not central_nodes:
+        if not network.edge_count:
+            rendered = "\n\n".join(self.shape_renderer.render_shape(shape, label).text
+                                    for shape, label in zip(network.shapes, network.labels))
+        else:
+            # For complex networks, use a layered layout
+            rendered = self._render_complex_network(network, budget)
+        if budget is not None:
+            budget.check_time()
+            budget.add_output(rendered)
+        return rendered
+    
+    def _render_complex_network(self, network, budget=None):
+        """Render complex network with multiple connections as one layered diagram"""
+        if not network.central_nodes():
             # No central nodes, fall back to individual connections
-            return self._render_separate_connections(network)
-        
-        # Take the first central node as the main hub
-        central_node = central_nodes[0]
-        central_info = network['nodes'][central_node]
-        central_shape = f"{central_info['shape'].capitalize()}({central_info['label']})"
-        central_rendered = self.shape_renderer.render_single_shape(central_shape)
-        central_lines = central_rendered.split('\n')
-        
-        # Create a grid layout
-        result_sections = []
+            return self._render_separate_connections(network, budget)
         
-        # Render input connections (multiple inputs connecting to central)
-        if input_nodes:
-            for input_node in input_nodes:
-                input_info = network['nodes'][input_node]
-                input_shape = f"{input_info['shape'].capitalize()}({input_info['label']})"
-                
-                # Use the connection system to render this pair
-                connection_line = f"{input_shape} connects to horizontal {central_shape}"
-                parsed_connection = self.connection_system.parse_connection(connection_line)
-                if parsed_connection:
-                    rendered_connection = self.connection_system.render_connection(
-                        parsed_connection["from"], parsed_connection["to"], parsed_connection["horizontal"], 
-                        parsed_connection["label"], parsed_connection.get("arrow_type")
-                    )
-                    if rendered_connection:
-                        result_sections.append(rendered_connection)
-        
-        # Render output connections (central connecting to multiple outputs)
-        if output_nodes:
-            for output_node in output_nodes:
-                output_info = network['nodes'][output_node]
-                output_shape = f"{output_info['shape'].capitalize()}({output_info['label']})"
-                
-                # Use the connection system to render this pair
-                connection_line = f"{central_shape} connects to horizontal {output_shape}"
-                parsed_connection = self.connection_system.parse_connection(connection_line)
-                if parsed_connection:
-                    rendered_connection = self.connection_system.render_connection(
-                        parsed_connection["from"], parsed_connection["to"], parsed_connection["horizontal"], 
-                        parsed_connection["label"], parsed_connection.get("arrow_type")
-                    )
-                    if rendered_connection:
-                        result_sections.append(rendered_connection)
+        # Lay the whole graph out once from measured sizes, so every node is drawn exactly once
+        return self.painter.paint_string(self.layout_network(network, budget))
+    
+    def _node_size(self, name, shape, label):
+        metrics = self.shape_renderer.measure(shape, label)
+        if not metrics.width:
+            return len(name), 1  # Drawn as its name, see _layout_scene
+        return metrics.width, metrics.height
+    
+    def _edge_connectors(self, network):
+        """The parsed Connector of every edge, parsing each distinct connector once"""
+        parsed = [Connector(raw, horizontal) for raw, horizontal in network.connectors]
+        return [parsed[connector] for connector in network.edge_connectors]
+    
+    def layout_network(self, network, budget=None):
+        """Lay out a network with central nodes as a Scene, without drawing it.
+        
+        Each weakly connected component is laid out on its own, in a process
+        pool when workers > 1, and the components are stacked top to bottom in
+        the order their first node was seen.
+        """
+        sizes = [self._node_size(name, shape, label)
+                 for name, shape, label in zip(network.names, network.shapes, network.labels)]
+        connectors = self._edge_connectors(network)
+        label_widths = [len(connector.label) if connector.label else 0 for connector in connectors]
+        components = network.components()
+        if len(components) == 1:
+            layout = self.layout.layout(sizes, list(zip(network.edge_sources, network.edge_targets)), label_widths,
+                                        budget)
+            return self._layout_scene(layout, network, connectors, budget)
+        
+        tasks = []
+        for nodes, edges in components:
+            local = {node: i for i, node in enumerate(nodes)}
+            tasks.append((
+                self.layout,
+                [sizes[node] for node in nodes],
+                [(local[network.edge_sources[edge]], local[network.edge_targets[edge]]) for edge in edges],
+                [label_widths[edge] for edge in edges],
+            ))
+        layouts = self._layout_components(tasks, budget)
+        layout = stack_layouts([(nodes, edges, layout) for (nodes, edges), layout in zip(components, layouts)],
+                               network.node_count, network.edge_count)
+        return self._layout_scene(layout, network, connectors, budget)
+    
+    def _layout_components(self, tasks, budget=None):
+        """Run _layout_component over tasks, keeping their order and checking the time limit after each.
         
-        # If we have both inputs and outputs, we need a different approach
-        if input_nodes and output_nodes:
-            # Create a comprehensive layout showing the central node only once
-            # This is complex - for now, show input->central and central->output separately
-            # but ensure central appears only once by using the first input->central connection
-            # and replacing subsequent central nodes with spacing
-            
-            if result_sections:
-                first_section = result_sections[0]  # This contains central node
-                remaining_sections = []
-                
-                for section in result_sections[1:]:
-                    # Replace central node appearances with equivalent spacing
-                    section_lines = section.split('\n')
-                    cleaned_lines = []
-                    for line in section_lines:
-                        if central_info['label'] in line:
-                            # Replace the central node with spaces to maintain layout
-                            cleaned_line = line.replace(central_info['label'], ' ' * len(central_info['label']))
-                            # Also clean up the box characters
-                            for char in ['┌', '┐', '└', '┘', '│', '─']:
-                                cleaned_line = cleaned_line.replace(char, ' ')
-                            cleaned_lines.append(cleaned_line)
-                        else:
-                            cleaned_lines.append(line)
-                    remaining_sections.append('\n'.join(cleaned_lines))
-                
-                return first_section + '\n\n' + '\n\n'.join(remaining_sections)
+        Components laid out in this process also check it as they are laid out.
+        """
+        if self.pool is None:
+            results = (_layout_component(task, budget) for task in tasks)
+        else:
+            results = self.pool.imap(_layout_component, tasks, max(1, len(tasks) // (self.workers * 4)))
+        layouts = []
+        for layout in results:
+            layouts.append(layout)
+            if budget is not None:
+                budget.check_time()
+        return layouts
+    
+    def _layout_scene(self, layout, network, connectors, budget=None):
+        """Turn a Layout into a Scene of node boxes, edge wires and labels"""
+        if budget is not None:
+            budget.check_time()
+            # Painting writes at most width x height cells, so stop before painting anything that could go over
+            budget.check_output(layout.width * layout.height)
+        boxes = []
+        for (x, y, width, height), name, shape, label in zip(layout.boxes, network.names, network.shapes, network.labels):
+            if self.shape_renderer.measure(shape, label).width:
+                boxes.append(Box(x, y, width, height, shape, label))
+            else:
+                # Unknown shapes still need to appear in the network, so show their name
+                boxes.append(Box(x, y, width, height, None, name))
         
-        return '\n\n'.join(result_sections) if result_sections else central_rendered
+        wires = []
+        labels = []
+        for points, position, connector in zip(layout.edges, layout.labels, connectors):
+            if not points:
+                continue
+            wires.append(Wire(points, connector.arrow_type))
+            if position:
+                labels.append(Label(position[0], position[1], connector.label))
+        return Scene(boxes, wires, labels, [], [0] * layout.height)
     
-    def _render_separate_connections(self, network):
-        """Render connections separately (fallback method)"""
+    def _render_separate_connections(self, network, budget=None):
+        """Render each connection on its own (fallback method)"""
+        connectors = self._edge_connectors(network)
         results = []
-        for connection in network['connections']:
-            source = connection['source']
-            target = connection['target']
-            
-            source_shape = f"{source['shape'].capitalize()}({source['label']})"
-            target_shape = f"{target['shape'].capitalize()}({target['label']})"
-            
-            connection_line = f"{source_shape} connects to {connection['direction']} {target_shape}"
-            if connection['label']:
-                connection_line = f"{source_shape} connects to({connection['label']}) {connection['direction']} {target_shape}"
-            
-            parsed = self.connection_system.parse_connection(connection_line)
-            if parsed:
-                rendered = self.connection_system.render_connection(
-                    parsed["from"], parsed["to"], parsed["horizontal"], 
-                    parsed["label"], parsed.get("arrow_type")
-                )
-                results.append(rendered)
-        
-        return '\n\n'.join(results)
\ No newline at end of file
+        for edge, connector in enumerate(connectors):
+            if budget is not None:
+                budget.check_time()
+            source = network.edge_sources[edge]
+            target = network.edge_targets[edge]
+            scene = self.connection_system.layout_shapes(
+                (network.shapes[source], network.labels[source]),
+                (network.shapes[target], network.labels[target]),
+                connector.horizontal, connector.label, connector.arrow_type
+            )
+            results.append(self.painter.paint_string(scene) if scene else "")
+        
+        return '\n\n'.join(results)
+
+
+def _layout_component(task, budget=None):
+    """Lay out one component, in a worker process or not: task is (layout, sizes, edges, label widths)"""
+    layout, sizes, edges, label_widths = task
+    return layout.layout(sizes, edges, label_widths, budget)
@@ -0,0 +1,226 @@
+import numpy as np
+
+
+SPACE = 0x20
+NEWLINE = 0x0A
+CODE_POINT = np.dtype('<u4')
+
+
+def _code_points(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype=CODE_POINT)
+
+
+class NumpyCanvas:
+    """Canvas backed by a NumPy grid of uint32 code points.
+
+    Same drawing interface as Canvas. Cells start out as spaces and each row
+    tracks how far it has been drawn, so every blit, line and text write is a
+    single vectorized assignment and the whole grid is decoded in one pass by
+    to_string(). The batch methods (blits, writes, hlines, vlines) draw all of
+    a scene's boxes, wires or labels in a handful of scatters. Per-call overhead
+    is higher than the pure-Python Canvas, so it only pays off for large
+    diagrams; see benchmarks/canvas_backends.py.
+    """
+
+    def __init__(self, height=0, width=0):
+        self._shapes = {}  # Encoded shapes by their lines, see _encode_shape
+        self.grid = np.full((max(height, 16), max(width, 64)), SPACE, dtype=CODE_POINT)
+        self.lengths = np.zeros(self.grid.shape[0], dtype=np.int64)
+        self._height = 0
+        self.width = 0
+
+    @property
+    def height(self):
+        return self._height
+
+    def _reserve(self, height, width):
+        """Grow the grid (at least doubling) so it holds height rows of width cells"""
+        rows, cols = self.grid.shape
+        if height <= rows and width <= cols:
+            return
+        new_rows = rows if height <= rows else max(height, rows * 2)
+        new_cols = cols if width <= cols else max(width, cols * 2)
+        grid = np.full((new_rows, new_cols), SPACE, dtype=CODE_POINT)
+        grid[:rows, :cols] = self.grid
+        lengths = np.zeros(new_rows, dtype=np.int64)
+        lengths[:rows] = self.lengths
+        self.grid = grid
+        self.lengths = lengths
+
+    def _extend(self, y, height, ends, widest):
+        """Record that rows y..y+height-1 are drawn up to ends, the furthest of which is widest"""
+        if y + height > self._height:
+            self._height = y + height
+        row_lengths = self.lengths[y:y + height]
+        np.maximum(row_lengths, ends, out=row_lengths)
+        if widest > self.width:
+            self.width = widest
+
+    def row_length(self, y):
+        return int(self.lengths[y]) if y < self._height else 0
+
+    def row_text(self, y):
+        if y >= self._height:
+            return ''
+        return self.grid[y, :self.lengths[y]].tobytes().decode('utf-32-le')
+
+    def char_at(self, x, y):
+        if y < self._height and x < self.lengths[y]:
+            return chr(self.grid[y, x])
+        return ' '
+
+    def ensure_rows(self, height):
+        if height > self._height:
+            self._reserve(height, 0)
+            self._height = height
+
+    def write(self, x, y, text):
+        """Draw text starting at column x of row y, padding the row with spaces up to x"""
+        end = x + len(text)
+        self._reserve(y + 1, end)
+        self.grid[y, x:end] = _code_points(text)
+        self._extend(y, 1, end, end)
+
+    def append(self, y, text):
+        """Draw text right after the current end of row y"""
+        self.write(self.row_length(y), y, text)
+
+    def pad(self, y, width):
+        """Extend row y with spaces until it is at least width long"""
+        self._reserve(y + 1, width)
+        self._extend(y, 1, width, width)
+
+    def blit(self, shape, x, y):
+        """Draw a shape (a RenderedShape or a sequence of lines) with its top-left corner at (x, y)"""
+        lines = tuple(getattr(shape, 'lines', shape))
+        if not lines:
+            return
+        if lines not in self._shapes:
+            self._shapes[lines] = self._encode_shape(lines)
+        codes, cells, line_lengths, widest = self._shapes[lines]
+        height = len(lines)
+        self._reserve(y + height, x + widest)
+
+        if cells is None:
+            # Rectangular shapes are one 2D slice assignment
+            self.grid[y:y + height, x:x + widest] = codes
+        else:
+            # Ragged shapes (e.g. triangles) scatter each code point to its cell
+            rows, cols = cells
+            self.grid[rows + y, cols + x] = codes
+        self._extend(y, height, x + line_lengths, x + widest)
+
+    def _encode_shape(self, lines):
+        """Return (code points, (rows, cols) or None if rectangular, line lengths, widest line)"""
+        codes = _code_points(''.join(lines))
+        line_lengths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+        widest = int(line_lengths.max())
+        if (line_lengths == widest).all():
+            return codes.reshape(len(lines), widest), None, line_lengths, widest
+        starts = np.repeat(np.cumsum(line_lengths) - line_lengths, line_lengths)
+        rows = np.repeat(np.arange(len(lines)), line_lengths)
+        cols = np.arange(codes.size) - starts
+        return codes, (rows, cols), line_lengths, widest
+
+    def hline(self, x, y, length, char='─'):
+        self._reserve(y + 1, x + length)
+        self.grid[y, x:x + length] = ord(char)
+        self._extend(y, 1, x + length, x + length)
+
+    def vline(self, x, y, length, char='│'):
+        self._reserve(y + length, x + 1)
+        self.grid[y:y + length, x] = ord(char)
+        self._extend(y, length, x + 1, x + 1 if length else 0)
+
+    def _extend_at(self, rows, ends):
+        """Record that each of rows is drawn up to the matching entry of ends"""
+        height = int(rows.max()) + 1
+        if height > self._height:
+            self._height = height
+        np.maximum.at(self.lengths, rows, ends)
+        widest = int(ends.max())
+        if widest > self.width:
+            self.width = widest
+
+    def blits(self, placements):
+        """Draw (shape, x, y) placements, one scatter per distinct set of line lengths"""
+        groups = {}  # line lengths -> ([lines], [x], [y])
+        for shape, x, y in placements:
+            lines = tuple(getattr(shape, 'lines', shape))
+            if lines:
+                group = groups.setdefault(tuple(map(len, lines)), ([], [], []))
+                group[0].append(lines)
+                group[1].append(x)
+                group[2].append(y)
+
+        for line_lengths, (shapes, xs, ys) in groups.items():
+            if len(shapes) == 1:
+                self.blit(shapes[0], xs[0], ys[0])
+                continue
+            xs = np.array(xs, dtype=np.int64)
+            ys = np.array(ys, dtype=np.int64)
+            lengths = np.array(line_lengths, dtype=np.int64)
+            self._reserve(int(ys.max()) + len(line_lengths), int(xs.max() + lengths.max()))
+            # The cells of one shape relative to its corner, repeated for every placement
+            rows = np.repeat(np.arange(len(line_lengths)), lengths)
+            cols = np.arange(rows.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            codes = _code_points(''.join(''.join(lines) for lines in shapes)).reshape(len(shapes), rows.size)
+            self.grid[ys[:, None] + rows, xs[:, None] + cols] = codes
+            self._extend_at((ys[:, None] + np.arange(len(line_lengths))).ravel(),
+                            (xs[:, None] + lengths).ravel())
+
+    def writes(self, texts):
+        """Draw (x, y, text) runs of text in one scatter"""
+        texts = [(x, y, text) for x, y, text in texts if text]
+        if not texts:
+            return
+        xs, ys, strings = zip(*texts)
+        xs = np.array(xs, dtype=np.int64)
+        ys = np.array(ys, dtype=np.int64)
+        lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+        self._scatter(xs, ys, lengths, _code_points(''.join(strings)))
+
+    def hlines(self, runs, char='─'):
+        """Draw (x, y, length) horizontal lines in one scatter"""
+        if not runs:
+            return
+        xs, ys, lengths = np.array(runs, dtype=np.int64).reshape(-1, 3).T
+        self._scatter(xs, ys, lengths, ord(char))
+
+    def _scatter(self, xs, ys, lengths, codes):
+        """Fill lengths[i] cells rightwards from (xs[i], ys[i]) with codes, in order"""
+        ends = xs + lengths
+        self._reserve(int(ys.max()) + 1, int(ends.max()))
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        self.grid[np.repeat(ys, lengths), np.repeat(xs, lengths) + np.arange(starts.size) - starts] = codes
+        self._extend_at(ys, ends)
+
+    def vlines(self, runs, char='│'):
+        """Draw (x, y, length) vertical lines in one scatter"""
+        runs = [run for run in runs if run[2] > 0]
+        if not runs:
+            return
+        xs, ys, lengths = np.array(runs, dtype=np.int64).T
+        self._reserve(int((ys + lengths).max()), int(xs.max()) + 1)
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = np.repeat(ys, lengths) + np.arange(starts.size) - starts
+        cols = np.repeat(xs, lengths)
+        self.grid[rows, cols] = ord(char)
+        self._extend_at(rows, cols + 1)
+
+    def lines(self):
+        return [self.row_text(y) for y in range(self._height)]
+
+    def to_string(self):
+        height = self._height
+        if not height:
+            return ''
+        lengths = self.lengths[:height]
+        width = int(lengths.max())
+
+        # Lay the rows out with a newline after each one, then keep only the drawn cells
+        cells = np.empty((height, width + 1), dtype=CODE_POINT)
+        cells[:, :width] = self.grid[:height, :width]
+        cells[np.arange(height), lengths] = NEWLINE
+        drawn = np.arange(width + 1) <= lengths[:, None]
+        return cells[drawn][:-1].tobytes().decode('utf-32-le')
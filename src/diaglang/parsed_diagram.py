@@ -0,0 +1,44 @@
+import itertools
+
+
+class ParsedDiagram:
+    """A diagram source parsed once: its title and one lexed Statement per line.
+
+    The same statements drive network detection and the per-line renderers,
+    so no line is lexed twice whichever way the diagram is drawn. Only a
+    diagram that may be a network keeps its statements in a list; any other
+    diagram gets a LazyStatements holding just its connection lines, so the
+    rest render in memory that follows the longest line rather than the file.
+    """
+
+    def __init__(self, title, statements, line_count, connection_lines, shared_nodes, invalid_lines=0):
+        self.title = title
+        self.statements = statements
+        self.line_count = line_count  # Lines after the title
+        # Lines the network detection counts as connections
+        self.connection_lines = connection_lines
+        # Whether some node is the target of one connection and the source of another
+        self.shared_nodes = shared_nodes
+        # Connection lines with a syntax error, which only the per-line renderers report
+        self.invalid_lines = invalid_lines
+
+    @property
+    def may_be_network(self):
+        """Only valid diagrams with several connection lines sharing a node can be networks"""
+        return self.connection_lines > 1 and self.shared_nodes and not self.invalid_lines
+
+
+class LazyStatements:
+    """The statements of a diagram's lines: those already lexed, and the rest lexed as they are reached"""
+
+    def __init__(self, shapes, skip, parse, lexed=None):
+        self.shapes = shapes  # Re-iterable source lines
+        self.skip = skip  # Title lines to leave out
+        self.parse = parse
+        self.lexed = lexed or {}  # Line number (after the title) -> statement
+
+    def __iter__(self):
+        lexed = self.lexed
+        for number, line in enumerate(itertools.islice(self.shapes, self.skip, None)):
+            statement = lexed.get(number)
+            yield statement if statement is not None else self.parse(line)
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import tempfile
+
+from .version import __version__
+
+
+class RenderCache:
+    """Persistent cache of rendered output, keyed by source content, options and library version.
+
+    Entries are plain files named after their key. Writes go through a temporary
+    file and os.replace, so concurrent processes never see a partial entry, and
+    the least recently used entries are evicted once the cache exceeds max_bytes.
+
+    The size of the cache is scanned on the first write and then kept up to
+    date as entries are written. The directory is only scanned again when that
+    running total goes over max_bytes, and eviction then frees space down to
+    EVICT_TO of max_bytes, so a write costs O(1) amortized rather than a scan.
+    Writes by other processes are picked up at the next scan.
+    """
+
+    EVICT_TO = 0.9
+
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # Running total of entry sizes, None until the first scan
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for_bytes(self, data, default_shape=None):
+        """Key of a file's contents, read once so the output cached under it is rendered from the same bytes"""
+        digest = self._new_digest("file", default_shape)
+        digest.update(data)
+        return digest.hexdigest()
+
+    def key_for_text(self, text, default_shape=None):
+        digest = self._new_digest("text", default_shape)
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                value = f.read()
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                f.write(value)
+            size = os.path.getsize(temp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if self._size is not None:
+            self._size += size - replaced
+        if self._size is None or self._size > self.max_bytes:
+            self._evict()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def _new_digest(self, source_kind, default_shape):
+        digest = hashlib.sha256()
+        header = f"diaglang {__version__}\0{source_kind}\0{default_shape or ''}\0"
+        digest.update(header.encode('utf-8'))
+        return digest
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.txt')
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.txt'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by another process
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes * self.EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._size = total
@@ -0,0 +1,29 @@
+class RenderMemo:
+    """Per-line work from one render of a file, offered to the next render of it.
+
+    Each render starts a new memo from the previous one and only keeps the entries
+    it used, so memory follows the current file and unchanged lines are never
+    rewritten, lexed or rendered twice.
+    """
+
+    def __init__(self, previous=None):
+        self._previous = previous._entries if previous else {}
+        self._entries = {}
+        self.reused = 0
+        self.computed = 0
+
+    def wrap(self, kind, function, key=None):
+        """Memoize a one-argument function under kind, keyed by key(argument) or the argument"""
+        def memoized(value):
+            entry_key = (kind, key(value) if key else value)
+            if entry_key in self._entries:
+                return self._entries[entry_key]
+            if entry_key in self._previous:
+                result = self._previous[entry_key]
+                self.reused += 1
+            else:
+                result = function(value)
+                self.computed += 1
+            self._entries[entry_key] = result
+            return result
+        return memoized
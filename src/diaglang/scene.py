@@ -0,0 +1,211 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+
+from .canvas import Canvas
+from .shape_renderer import ShapeRenderer
+
+
+# Layout records. Positions are (column, row) cells from the top-left corner.
+
+# A shape with its top-left corner at (x, y). A box without a shape_type shows
+# its label as plain text, one line per row.
+Box = namedtuple('Box', ['x', 'y', 'width', 'height', 'shape_type', 'label'])
+# A connection through a list of (x, y) points, source end first. arrow_type is
+# "point to", "point back", "double point" or None.
+Wire = namedtuple('Wire', ['points', 'arrow_type'])
+# Text written over whatever is under it, starting at (x, y)
+Label = namedtuple('Label', ['x', 'y', 'text'])
+# A single-cell glyph named by kind (see GLYPHS), such as a junction on a box border
+Mark = namedtuple('Mark', ['x', 'y', 'kind'])
+# Everything one diagram places. row_widths has one entry per row of the
+# diagram; each row is padded with spaces to at least that width.
+Scene = namedtuple('Scene', ['boxes', 'wires', 'labels', 'marks', 'row_widths'])
+
+
+# Wire directions, combined per cell into the box-drawing character that joins them
+NORTH, EAST, SOUTH, WEST = 1, 2, 4, 8
+WIRE_CHARS = {
+    EAST: '─', WEST: '─', EAST | WEST: '─',
+    NORTH: '│', SOUTH: '│', NORTH | SOUTH: '│',
+    EAST | SOUTH: '┌', WEST | SOUTH: '┐', NORTH | EAST: '└', NORTH | WEST: '┘',
+    NORTH | SOUTH | EAST: '├', NORTH | SOUTH | WEST: '┤',
+    EAST | WEST | SOUTH: '┬', EAST | WEST | NORTH: '┴',
+    NORTH | EAST | SOUTH | WEST: '┼',
+}
+
+GLYPHS = {
+    'tee_down': '┬',  # A connection leaving the bottom border of a box
+    'shaft': '|',  # The shaft of a vertical arrow
+    'arrow_north': '^',
+    'arrow_east': '>',
+    'arrow_south': 'v',
+    'arrow_west': '<',
+}
+
+
+def measure_box(shape_renderer, shape_type, label):
+    """A Box at (0, 0) sized for a shape, or for plain text if shape_type is None"""
+    if shape_type is None:
+        lines = label.split('\n')
+        return Box(0, 0, max(len(line) for line in lines), len(lines), None, label)
+    metrics = shape_renderer.measure(shape_type, label)
+    return Box(0, 0, metrics.width, metrics.height, shape_type, label)
+
+
+def has_bottom_border(box):
+    """Whether a connection leaving the bottom of box can join its border with a tee_down mark"""
+    if box.shape_type is None:
+        return '┘' in box.label.split('\n')[-1]
+    return box.shape_type in ('rectangle', 'square')
+
+
+class ScenePainter:
+    """Turns a Scene into text.
+
+    Boxes are blitted first, then wires, labels and marks over them, each kind
+    as one batch of canvas calls. Wires are merged into straight runs per row
+    and column, drawn as hlines and vlines; only the cells where runs end or
+    meet are worked out one by one, to get the right junction character. The characters come from wire_chars and
+    glyphs, so the same scene can be repainted in another style.
+    """
+
+    def __init__(self, shape_renderer=None, canvas_class=None, wire_chars=None, glyphs=None):
+        self.shape_renderer = shape_renderer or ShapeRenderer()
+        self.canvas_class = canvas_class or Canvas
+        self.wire_chars = wire_chars or WIRE_CHARS
+        self.glyphs = glyphs or GLYPHS
+
+    def paint(self, scene, canvas=None):
+        """Draw scene into canvas (a new one by default) and return the canvas"""
+        if canvas is None:
+            canvas = self.canvas_class()
+        canvas.ensure_rows(len(scene.row_widths))
+        canvas.blits([(self.box_lines(box), box.x, box.y) for box in scene.boxes])
+
+        across = defaultdict(list)  # row -> [(first column, last column)] of horizontal wire
+        down = defaultdict(list)  # column -> [(first row, last row)] of vertical wire
+        for wire in scene.wires:
+            for (x1, y1), (x2, y2) in zip(wire.points, wire.points[1:]):
+                if y1 == y2:
+                    across[y1].append((min(x1, x2), max(x1, x2)))
+                else:
+                    down[x1].append((min(y1, y2), max(y1, y2)))
+        across = {y: _Runs(runs) for y, runs in across.items()}
+        down = {x: _Runs(runs) for x, runs in down.items()}
+
+        def directions(cell):
+            x, y = cell
+            result = 0
+            if y in across:
+                result |= across[y].directions(x, WEST, EAST)
+            if x in down:
+                result |= down[x].directions(y, NORTH, SOUTH)
+            return result
+
+        # Draw each run straight through, then fix up the cells where runs end or meet
+        joints = set()
+        horizontal = []
+        for y, runs in across.items():
+            for low, high in runs:
+                horizontal.append((low, y, high - low + 1))
+                joints.add((low, y))
+                joints.add((high, y))
+        canvas.hlines(horizontal, self.wire_chars[EAST | WEST])
+        vertical = []
+        rows = sorted(across)
+        for x, runs in down.items():
+            for low, high in runs:
+                vertical.append((x, low, high - low + 1))
+                joints.add((x, low))
+                joints.add((x, high))
+                for y in rows[bisect_left(rows, low):bisect_right(rows, high)]:
+                    if across[y].find(x):
+                        joints.add((x, y))
+        canvas.vlines(vertical, self.wire_chars[NORTH | SOUTH])
+        joint_chars = []
+        for cell in sorted(joints, key=_row_major):
+            cell_directions = directions(cell)
+            if cell_directions:
+                joint_chars.append((cell[0], cell[1], self.wire_chars[cell_directions]))
+        canvas.writes(joint_chars)
+
+        # Labels go over the wires, and marks over everything
+        canvas.writes([(label.x, label.y, label.text) for label in scene.labels])
+        marks = {}
+        for wire in scene.wires:
+            points = wire.points
+            if wire.arrow_type in ('point to', 'double point'):
+                cell, kind = self._arrowhead(points[-2], points[-1], directions)
+                marks[cell] = self.glyphs[kind]
+            if wire.arrow_type in ('point back', 'double point'):
+                cell, kind = self._arrowhead(points[1], points[0], directions)
+                marks[cell] = self.glyphs[kind]
+        for mark in scene.marks:
+            marks[mark.x, mark.y] = self.glyphs[mark.kind]
+        canvas.writes([(x, y, char) for (x, y), char in sorted(marks.items(), key=lambda item: _row_major(item[0]))])
+
+        for y, width in enumerate(scene.row_widths):
+            if width:
+                canvas.pad(y, width)
+        return canvas
+
+    def paint_string(self, scene):
+        return self.paint(scene).to_string()
+
+    def box_lines(self, box):
+        if box.shape_type is None:
+            return box.label.split('\n')
+        return self.shape_renderer.render_shape(box.shape_type, box.label).lines
+
+    def _arrowhead(self, before, end, directions):
+        """Where the arrowhead of a wire arriving at end from before goes, and which way it points.
+
+        If other wires join at the end cell, the arrowhead goes on the cell before
+        it so the junction stays visible.
+        """
+        (x1, y1), (x2, y2) = before, end
+        if y1 == y2:
+            step, kind, arriving = (1, 'arrow_east', WEST) if x2 > x1 else (-1, 'arrow_west', EAST)
+            if directions(end) != arriving:
+                return (x2 - step, y2), kind
+        else:
+            step, kind, arriving = (1, 'arrow_south', NORTH) if y2 > y1 else (-1, 'arrow_north', SOUTH)
+            if directions(end) != arriving:
+                return (x2, y2 - step), kind
+        return end, kind
+
+
+def _row_major(cell):
+    return cell[1], cell[0]
+
+
+class _Runs:
+    """The wire runs along one row or column, merged where they share a cell"""
+
+    def __init__(self, runs):
+        runs.sort()
+        merged = []
+        for low, high in runs:
+            if merged and low <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], high)
+            else:
+                merged.append([low, high])
+        self.runs = merged
+        self.starts = [low for low, high in merged]
+
+    def __iter__(self):
+        return iter(self.runs)
+
+    def find(self, position):
+        """The run covering position, or None"""
+        index = bisect_right(self.starts, position) - 1
+        if index >= 0 and self.runs[index][1] >= position:
+            return self.runs[index]
+        return None
+
+    def directions(self, position, backward, forward):
+        """Which ways the wire at position goes: backward unless it starts there, forward unless it ends there"""
+        run = self.find(position)
+        if run is None:
+            return 0
+        return (backward if position > run[0] else 0) | (forward if position < run[1] else 0)
@@ -0,0 +1,160 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+
+from .worker_pool import init_worker_renderer, worker_renderer
+
+
+# Messages are a 4-byte big-endian length followed by that many bytes of UTF-8 JSON
+HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+
+def default_socket_path():
+    if os.environ.get('DIAGLANG_SOCKET'):
+        return os.environ['DIAGLANG_SOCKET']
+    import tempfile
+    
+    uid = os.getuid() if hasattr(os, 'getuid') else 'user'
+    return os.path.join(tempfile.gettempdir(), f'diaglang-{uid}.sock')
+
+
+def send_message(sock, message):
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_message(sock):
+    """Read one message, or return None if the peer closed the connection between messages"""
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    if length > MAX_MESSAGE_SIZE:
+        raise ConnectionError(f"message of {length} bytes exceeds the {MAX_MESSAGE_SIZE} byte limit")
+    payload = _recv_exactly(sock, length)
+    if payload is None:
+        raise ConnectionError("connection closed in the middle of a message")
+    return json.loads(payload.decode('utf-8'))
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1024 * 1024))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ConnectionError("connection closed in the middle of a message")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def _render_request(request):
+    """Answer one request with the warm renderer of this worker process"""
+    renderer = worker_renderer()
+    default_shape = request.get('default_shape')
+    try:
+        if 'filename' in request:
+            output = renderer.render_ascii(request['filename'], default_shape=default_shape)
+        else:
+            output = renderer.render_string(request.get('source', ''), default_shape=default_shape)
+    except (OSError, UnicodeDecodeError) as e:
+        return {'error': str(e)}
+    return {'output': output}
+
+
+class RenderRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # A connection may carry any number of requests, answered in order
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (ConnectionError, ValueError):
+                return
+            if request is None:
+                return
+            try:
+                response = self.server.executor.submit(_render_request, request).result()
+            except Exception as e:
+                response = {'error': f"{type(e).__name__}: {e}"}
+            send_message(self.request, response)
+
+
+class RenderServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Long-lived render daemon answering length-prefixed JSON requests on a Unix socket.
+
+    Requests are {"filename": path} or {"source": text}, optionally with
+    "default_shape"; responses are {"output": text} or {"error": message}.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=None, workers=None, cache_dir=None):
+        from concurrent.futures import ProcessPoolExecutor
+        
+        self.socket_path = socket_path or default_socket_path()
+        self.executor = None
+        self._remove_stale_socket()
+        super().__init__(self.socket_path, RenderRequestHandler)
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker_renderer,
+                                            initargs=(cache_dir,))
+
+    def server_close(self):
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            # Left behind by a daemon that didn't shut down cleanly
+            os.remove(self.socket_path)
+        else:
+            raise OSError(f"a diaglang daemon is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+
+class RenderClient:
+    """Sends render requests to a running RenderServer.
+
+    Connecting raises OSError when no daemon is listening, so callers can fall
+    back to rendering in-process; errors reported by the daemon raise RuntimeError.
+    """
+
+    def __init__(self, socket_path=None, timeout=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    def render(self, filename=None, source=None, default_shape=None):
+        if filename is not None:
+            request = {'filename': os.path.abspath(filename)}
+        else:
+            request = {'source': source or ''}
+        if default_shape:
+            request['default_shape'] = default_shape
+
+        if not hasattr(socket, 'AF_UNIX'):
+            raise OSError("Unix domain sockets are not available on this platform")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_message(sock, request)
+            response = recv_message(sock)
+
+        if response is None:
+            raise ConnectionError("daemon closed the connection without answering")
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['output']
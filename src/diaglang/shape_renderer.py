@@ -1,13 +1,97 @@
+from collections import OrderedDict, namedtuple
+
+
+# An immutable rendered shape; center is the column connectors attach to
+RenderedShape = namedtuple('RenderedShape', ['text', 'lines', 'width', 'height', 'center'])
+
+# The size of a shape without its text: vertical connectors attach at column
+# center, horizontal ones at row middle
+ShapeMetrics = namedtuple('ShapeMetrics', ['width', 'height', 'center', 'middle'])
+
+
 class ShapeRenderer:
+    def __init__(self, max_cached_shapes=1024):
+        self.max_cached_shapes = max_cached_shapes
+        self._shape_cache = OrderedDict()  # (shape_type, label) -> RenderedShape, least recently used first
+        self.hits = 0
+        self.misses = 0
+    
     def render_single_shape(self, shape_input):
-        # Parse shape and label
+        return self.shape_lines(shape_input).text
+    
+    def shape_lines(self, shape_input):
+        """Parse "Shape(label)" (or a bare shape name) and return its memoized RenderedShape"""
+        return self.render_shape(*self.parse_shape(shape_input))
+    
+    def shape_metrics(self, shape_input):
+        """Parse "Shape(label)" (or a bare shape name) and measure it, see measure()"""
+        return self.measure(*self.parse_shape(shape_input))
+    
+    def parse_shape(self, shape_input):
+        """Split "Shape(label)" into ("shape", "label"), or a bare shape name into ("shape", None)"""
         if '(' in shape_input and shape_input.endswith(')'):
-            shape_type = shape_input.split('(')[0].lower()
-            label = shape_input.split('(')[1][:-1]
+            return shape_input.split('(')[0].lower(), shape_input.split('(')[1][:-1]
+        return shape_input.lower(), None
+    
+    def measure(self, shape_type, label=None):
+        """Return the ShapeMetrics of a shape without drawing it.
+        
+        Sizes are worked out from the label length the same way _draw_shape lays
+        the shape out, so they always match render_shape(shape_type, label).
+        """
+        length = len(label) if label else 0
+        if shape_type in ("square", "rectangle"):
+            if label:
+                width = length + 4
+            elif shape_type == "square" or label is None:
+                width = 5 if shape_type == "square" else 7
+            else:
+                width = 4  # Empty rectangle label
+            height = 3
+        elif shape_type == "circle":
+            width = max(6, length + 2) + 4 if label is not None else 8
+            height = 4
+        elif shape_type == "triangle":
+            if label:
+                width, height = max(4, length + 2) + 2, 2
+            else:
+                width, height = 4, (3 if label == "" else 2)
+        elif shape_type == "diamond":
+            width = max(4, length + 2) + 2 if label else 4
+            height = 3
         else:
-            shape_type = shape_input.lower()
-            label = None
+            width, height = 0, 1  # Unknown shapes render as an empty string
+        return ShapeMetrics(width, height, width // 2, height // 2)
+    
+    def render_shape(self, shape_type, label=None):
+        """Return the RenderedShape for a shape type and label, reusing earlier renders"""
+        key = (shape_type, label)
+        cached = self._shape_cache.get(key)
+        if cached is not None:
+            self._shape_cache.move_to_end(key)
+            self.hits += 1
+            return cached
         
+        self.misses += 1
+        text = self._draw_shape(shape_type, label)
+        lines = tuple(text.split('\n'))
+        width = max(len(line) for line in lines)
+        rendered = RenderedShape(text, lines, width, len(lines), width // 2)
+        
+        self._shape_cache[key] = rendered
+        if len(self._shape_cache) > self.max_cached_shapes:
+            self._shape_cache.popitem(last=False)
+        return rendered
+    
+    def cache_info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._shape_cache),
+            'max_size': self.max_cached_shapes
+        }
+    
+    def _draw_shape(self, shape_type, label):
         if shape_type == "square":
             if label:
                 width = len(label) + 2  # padding on both sides
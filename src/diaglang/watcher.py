@@ -0,0 +1,65 @@
+import os
+import time
+
+from .batch_renderer import BatchRenderer
+
+
+class DiagramWatcher:
+    """Poll .diag files, directories and globs, re-rendering files only when they change.
+
+    Each file keeps the RenderMemo of its last render, so an edit only re-renders
+    the lines that changed (whole-file networks still re-layout as one block).
+    """
+
+    def __init__(self, renderer, paths, default_shape=None):
+        self.renderer = renderer
+        self.paths = paths
+        self.default_shape = default_shape
+        self._inputs = BatchRenderer()
+        self._stamps = {}  # filename -> (mtime_ns, size) at the last render
+        self._memos = {}  # filename -> RenderMemo of the last render
+
+    def poll(self):
+        """Re-render every file that is new or changed since the last poll.
+        
+        Returns (filename, output, error) tuples; files that vanished are forgotten.
+        """
+        filenames, _ = self._inputs.expand_inputs(self.paths)
+        results = []
+        seen = set()
+        for filename in filenames:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            seen.add(filename)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self._stamps.get(filename) == stamp:
+                continue
+
+            self._stamps[filename] = stamp
+            try:
+                output, memo = self.renderer.render_incremental(
+                    filename, self._memos.get(filename), default_shape=self.default_shape
+                )
+            except (OSError, UnicodeDecodeError) as e:
+                results.append((filename, None, str(e)))
+                continue
+            self._memos[filename] = memo
+            results.append((filename, output, None))
+
+        for filename in list(self._stamps):
+            if filename not in seen:
+                del self._stamps[filename]
+                self._memos.pop(filename, None)
+        return results
+
+    def run(self, on_render, interval=0.5, max_polls=None):
+        """Poll forever (or max_polls times), calling on_render for each re-rendered file"""
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            for result in self.poll():
+                on_render(*result)
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                time.sleep(interval)
@@ -0,0 +1,104 @@
+import threading
+from collections import deque
+
+
+# One renderer per worker thread or process, built once by the pool initializer
+_worker = threading.local()
+
+
+def init_worker_renderer(cache_dir=None, canvas_backend=None, limits=None):
+    """Pool initializer: build the DiagramRenderer this worker renders with, caching in cache_dir if given"""
+    from .diagram_renderer import DiagramRenderer
+    
+    render_cache = None
+    if cache_dir:
+        from .render_cache import RenderCache
+        render_cache = RenderCache(cache_dir)
+    _worker.renderer = DiagramRenderer(render_cache=render_cache, canvas_backend=canvas_backend, limits=limits)
+
+
+def worker_renderer():
+    """The renderer init_worker_renderer built for this worker, or None before it has run"""
+    return getattr(_worker, 'renderer', None)
+
+
+class WorkerPool:
+    """A process pool that starts on first use and is kept for every later render.
+
+    imap() keeps at most two chunks per worker in flight, so tasks are read
+    from their iterable only as fast as results are used, and memory stays
+    bounded however many tasks there are.
+    """
+
+    def __init__(self, workers, initializer=None, initargs=()):
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+
+    @property
+    def started(self):
+        return self._executor is not None
+
+    def imap(self, function, tasks, chunksize=1):
+        """Yield function(task) for every task, in order, running chunks of tasks in the workers.
+
+        If reading tasks raises, the tasks read before it are still run and
+        yielded, then the error is raised again. Chunks not started yet are
+        cancelled if the caller stops early.
+        """
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer,
+                                                 initargs=self.initargs)
+
+        chunks = _chunks(tasks, chunksize)
+        pending = deque()
+        error = None
+        try:
+            while True:
+                while chunks is not None and len(pending) < 2 * self.workers:
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        chunks = None
+                    except Exception as e:
+                        chunks = None
+                        error = e
+                    else:
+                        pending.append(self._executor.submit(_call_each, function, chunk))
+                if not pending:
+                    break
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Stop the workers, dropping tasks that haven't started"""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+def _chunks(tasks, size):
+    """Group tasks into lists of size, yielding the partial chunk read so far before any error"""
+    chunk = []
+    try:
+        for task in tasks:
+            chunk.append(task)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+    except Exception:
+        if chunk:
+            yield chunk
+        raise
+    if chunk:
+        yield chunk
+
+
+def _call_each(function, chunk):
+    return [function(task) for task in chunk]
@@ -1,23 +1,235 @@
 #!/usr/bin/env python3
+import os
+import signal
 import sys
 import argparse
-from diaglang import DiagramRenderer
+import diaglang
+
+
+def make_renderer(cache_dir, workers=1):
+    render_cache = None
+    if cache_dir:
+        render_cache = diaglang.RenderCache(cache_dir)
+    return diaglang.DiagramRenderer(render_cache=render_cache, workers=workers)
+
+
+def write_stream(blocks, out):
+    """Write rendered blocks as they arrive, separated like render_ascii's output"""
+    first = True
+    for block in blocks:
+        if not first:
+            out.write("\n\n")
+        out.write(block)
+        first = False
+    out.write("\n")
+
+
+def run_batch(args):
+    """Render several inputs, print a per-file summary to stderr and return the exit code"""
+    from diaglang.batch_renderer import BatchRenderer
+    
+    batch = BatchRenderer(jobs=args.jobs, default_shape=args.default_shape, cache_dir=args.cache_dir)
+    filenames, missing = batch.expand_inputs(args.filenames)
+    results = batch.render_files(filenames)
+    
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        root = batch.output_root(args.filenames)
+    
+    failed = len(missing)
+    cache_hits = 0
+    written = {}  # output path -> the file rendered there
+    for filename, output, error, cache_hit in results:
+        cache_hits += cache_hit
+        if error is not None:
+            failed += 1
+            print(f"FAILED  {filename}: {error}", file=sys.stderr)
+            continue
+        
+        if args.output_dir:
+            output_path = batch.output_path(filename, args.output_dir, root)
+            key = os.path.normcase(os.path.abspath(output_path))
+            if key in written:
+                # Never overwrite another input's output
+                failed += 1
+                print(f"FAILED  {filename}: {output_path} is already written from {written[key]}", file=sys.stderr)
+                continue
+            written[key] = filename
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            with open(output_path, "w") as f:
+                f.write(output + "\n")
+            print(f"ok      {filename} -> {output_path}", file=sys.stderr)
+        else:
+            print(f"==> {filename} <==")
+            print(output)
+            print(f"ok      {filename}", file=sys.stderr)
+    
+    for path in missing:
+        print(f"FAILED  {path}: no matching .diag files", file=sys.stderr)
+    
+    total = len(results) + len(missing)
+    print(f"Rendered {total - failed} of {total} files", file=sys.stderr)
+    if args.cache_dir:
+        print(f"Cache: {cache_hits} hits, {total - failed - cache_hits} misses", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def run_watch(args):
+    """Re-render inputs whenever they change until interrupted"""
+    from diaglang.batch_renderer import BatchRenderer
+    from diaglang.watcher import DiagramWatcher
+    
+    watcher = DiagramWatcher(diaglang.DiagramRenderer(), args.filenames, default_shape=args.default_shape)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        root = BatchRenderer().output_root(args.filenames)
+    
+    def on_render(filename, output, error):
+        if error is not None:
+            print(f"FAILED  {filename}: {error}", file=sys.stderr, flush=True)
+        elif args.output_dir:
+            output_path = BatchRenderer().output_path(filename, args.output_dir, root)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            with open(output_path, "w") as f:
+                f.write(output + "\n")
+            print(f"ok      {filename} -> {output_path}", file=sys.stderr, flush=True)
+        else:
+            print(f"==> {filename} <==")
+            print(output, flush=True)
+    
+    try:
+        watcher.run(on_render, interval=args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def run_server(argv):
+    """python main.py serve: run the render daemon until interrupted"""
+    from diaglang.server import RenderServer
+    
+    parser = argparse.ArgumentParser(
+        description="Serve render requests from a long-lived daemon on a Unix socket",
+        prog="python main.py serve"
+    )
+    parser.add_argument("--socket", help="Socket path (default: $DIAGLANG_SOCKET or a per-user temp path)")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: CPU count)")
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("DIAGLANG_CACHE_DIR"),
+        help="Reuse renders of unchanged files from this directory (default: $DIAGLANG_CACHE_DIR)"
+    )
+    args = parser.parse_args(argv)
+    
+    server = RenderServer(args.socket, workers=args.workers, cache_dir=args.cache_dir)
+    print(f"diaglang daemon listening on {server.socket_path}", file=sys.stderr, flush=True)
+    
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def render_with_daemon(args, filename):
+    """Render through a running daemon, falling back to in-process rendering without one"""
+    from diaglang.server import RenderClient
+    
+    try:
+        return RenderClient(args.socket).render(filename=filename, default_shape=args.default_shape)
+    except (OSError, RuntimeError):
+        return make_renderer(args.cache_dir).render_ascii(filename, default_shape=args.default_shape)
 
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["serve"]:
+        sys.exit(run_server(sys.argv[2:]))
+    
     parser = argparse.ArgumentParser(
         description="Render diaglang files as ASCII art diagrams",
         prog="python main.py"
     )
-    parser.add_argument("filename", help="Path to .diag file to render")
+    parser.add_argument("filenames", nargs="+", metavar="filename",
+                        help="Paths to .diag files, directories or glob patterns to render")
     parser.add_argument(
         "--default-shape", 
         choices=["rectangle", "square", "circle", "triangle", "diamond"],
         help="Default shape type for bare labels (enables simplified syntax)"
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write each diagram block as soon as it is rendered instead of all at the end"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help="Number of worker processes used to render multiple files, or the lines of a single file"
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Write each rendered diagram to <output-dir>/<path>.txt instead of stdout, "
+             "mirroring the inputs' paths below the directory they share"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("DIAGLANG_CACHE_DIR"),
+        help="Reuse renders of unchanged files from this directory (default: $DIAGLANG_CACHE_DIR)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the render cache even if a cache directory is configured"
+    )
+    
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and re-render inputs whenever they change"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="Seconds between checks for changes in --watch mode"
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Render through a running 'main.py serve' daemon, falling back to in-process rendering"
+    )
+    parser.add_argument("--socket", help="Daemon socket path for --daemon")
     
     args = parser.parse_args()
+    if args.no_cache:
+        args.cache_dir = None
+    
+    single_file = (len(args.filenames) == 1 and not args.output_dir
+                   and not os.path.isdir(args.filenames[0])
+                   and not any(char in args.filenames[0] for char in '*?['))
+    if args.stream and (args.watch or not single_file):
+        parser.error("--stream renders a single file to stdout")
     
-    renderer = DiagramRenderer()
-    result = renderer.render_ascii(args.filename, default_shape=args.default_shape)
-    print(result)
\ No newline at end of file
+    if args.watch:
+        sys.exit(run_watch(args))
+    elif single_file and args.daemon and not args.stream:
+        print(render_with_daemon(args, args.filenames[0]))
+    elif single_file:
+        renderer = make_renderer(args.cache_dir, workers=args.jobs)
+        filename = args.filenames[0]
+        try:
+            if args.stream:
+                write_stream(renderer.iter_render(filename, default_shape=args.default_shape), sys.stdout)
+            else:
+                result = renderer.render_ascii(filename, default_shape=args.default_shape)
+                print(result)
+        finally:
+            renderer.close()
+    else:
+        sys.exit(run_batch(args))
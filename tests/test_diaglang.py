@@ -431,7 +431,7 @@ class TestDiagReader(unittest.TestCase):
             reader = DiagReader()
             ascii_art = reader.render_ascii(test_file)
             # This should render A horizontal to B, then B vertical to C
-            expected = "┌───┐             /\\\n│ A │───flows───/ B  \\\n└─┬─┘           \n  │\n        sends\n  │\n  ______  \n /      \\ \n|   C    |\n \\______/ "
+            expected = "┌───┐             /\\\n│ A │───flows───/ B  \\\n└───┘              │\n                 sends\n                   │\n                ______  \n               /      \\ \n              |   C    |\n               \\______/ "
             self.assertEqual(ascii_art, expected)
         finally:
             if os.path.exists(test_file):
@@ -943,6 +943,995 @@ class TestDiagReader(unittest.TestCase):
             if os.path.exists(test_file):
                 os.remove(test_file)
 
+    def test_lexer_parses_line_into_groups_and_connectors(self):
+        from diaglang.lexer import Lexer
+        statement = Lexer().parse_line(
+            "Rectangle(A) and Circle(B) connects to(flows, point to) horizontal Triangle(C) connects to vertical Square(D)"
+        )
+        self.assertEqual(statement.kind, "chain")
+        self.assertEqual([[shape.text for shape in group] for group in statement.groups],
+                         [["Rectangle(A)", "Circle(B)"], ["Triangle(C)"], ["Square(D)"]])
+        first, second = statement.connectors
+        self.assertEqual((first.label, first.arrow_type, first.horizontal), ("flows", "point to", True))
+        self.assertEqual((second.label, second.arrow_type, second.horizontal), (None, None, False))
+        self.assertEqual(statement.groups[0][1].shape_type, "circle")
+        self.assertEqual(statement.groups[0][1].label, "B")
+
+    def test_subsystems_agree_on_lexed_statement(self):
+        reader = DiagReader()
+        line = "Rectangle(A) connects to(x) horizontal Triangle(B) and Square(C)"
+        statement = reader.lexer.parse_line(line)
+        self.assertEqual(statement.kind, "divergent")
+        self.assertEqual(reader.divergent_connections.divergent_from_statement(statement),
+                         reader.divergent_connections.parse_divergent_connections(line))
+        self.assertIsNone(reader.divergent_connections.parse_convergent_connections(line))
+        self.assertIsNone(reader.chain_system.parse_chain(line))
+        self.assertIn("Invalid arrow type",
+                      reader._validate_syntax("Rectangle(A) connects to(x, sideways) vertical Square(B)"))
+
+    def test_can_render_from_string_without_file(self):
+        test_file = "test_render_string.diag"
+        source = "Title(In Memory)\ncause connects to(causes, point to) horizontal effect\nAI Agent\n"
+        with open(test_file, "w") as f:
+            f.write(source)
+        
+        try:
+            reader = DiagReader()
+            expected = reader.render_ascii(test_file, default_shape="rectangle")
+            self.assertEqual(reader.render_string(source, default_shape="rectangle"), expected)
+            self.assertTrue(expected.startswith("In Memory\n\n"))
+            self.assertEqual(reader.render_string(""), "")
+            self.assertEqual(reader.render_string("\n  \n"), "")
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_can_render_from_iterable_of_lines(self):
+        test_file = "test_render_lines.diag"
+        source = "\n\nTitle(Lines)\n  Rectangle(A) connects to horizontal Circle(B)\n\nSquare(C)  \n\n"
+        with open(test_file, "w") as f:
+            f.write(source)
+        
+        try:
+            reader = DiagReader()
+            expected = reader.render_ascii(test_file)
+            with open(test_file) as f:
+                self.assertEqual(reader.render_lines(f), expected)
+            self.assertEqual(reader.render_lines(source.split("\n")), expected)
+            self.assertEqual(reader.render_lines(iter([])), "")
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_iter_render_yields_blocks_matching_render_ascii(self):
+        test_file = "test_iter_render.diag"
+        with open(test_file, "w") as f:
+            f.write("Title(Stream)\nSquare(A)\nRectangle(B) connects to horizontal Circle(C)\nTriangle(D)")
+        
+        try:
+            reader = DiagReader()
+            blocks = reader.iter_render(test_file)
+            self.assertEqual(next(blocks), "Stream")
+            rest = list(blocks)
+            self.assertEqual(len(rest), 3)
+            self.assertEqual("\n\n".join(["Stream"] + rest), reader.render_ascii(test_file))
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_cli_stream_flag_matches_default_output(self):
+        import subprocess
+        test_file = "test_cli_stream.diag"
+        with open(test_file, "w") as f:
+            f.write("Title(Streamed)\nSquare(CLI)\nRectangle(A) connects to(x) vertical Circle(B)")
+        
+        try:
+            plain = subprocess.run([sys.executable, "src/main.py", test_file],
+                                   capture_output=True, text=True)
+            streamed = subprocess.run([sys.executable, "src/main.py", "--stream", test_file],
+                                      capture_output=True, text=True)
+            self.assertEqual(streamed.returncode, 0)
+            self.assertEqual(streamed.stdout, plain.stdout)
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_lazy_line_iterator_handles_crlf_and_blank_lines(self):
+        test_file = "test_crlf_lines.diag"
+        with open(test_file, "wb") as f:
+            f.write(b"\r\n\r\n  Square(A)\r\n\r\n   \r\nCircle(B)  \r\n\r\n")
+        
+        try:
+            reader = DiagReader()
+            lines = reader.file_operations.iter_lines(test_file)
+            self.assertEqual(next(lines), "Square(A)")
+            self.assertEqual(list(lines), ["", "   ", "Circle(B)"])
+            self.assertEqual(reader.parse_shapes(test_file),
+                             reader.file_operations.parse_text(reader.read_file(test_file)))
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_lazy_line_iterator_handles_empty_file(self):
+        test_file = "test_empty_lazy.diag"
+        with open(test_file, "w") as f:
+            f.write("")
+        
+        try:
+            reader = DiagReader()
+            self.assertEqual(list(reader.file_operations.iter_lines(test_file)), [])
+            self.assertEqual(reader.render_ascii(test_file), "")
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_lazy_lines_survive_truncation_and_read_pipes(self):
+        import subprocess
+        test_file = "test_truncated_lazy.diag"
+        with open(test_file, "w") as f:
+            f.write("\n".join(f"Square(S{i})" for i in range(100000)))
+        
+        try:
+            reader = DiagReader()
+            lines = reader.file_operations.iter_lines(test_file)
+            self.assertEqual(next(lines), "Square(S0)")
+            # An editor saving over the file while it is read only cuts the read short
+            with open(test_file, "w") as f:
+                f.write("")
+            self.assertLess(len(list(lines)), 100000)
+            
+            # Pipes aren't regular files and can only be read once
+            source = "Title(Piped)\nSquare(A)\nRectangle(A) connects to horizontal Circle(B)"
+            with open(test_file, "w") as f:
+                f.write(source)
+            piped = subprocess.run([sys.executable, "src/main.py", "/dev/stdin"], input=source,
+                                   capture_output=True, text=True)
+            self.assertEqual(piped.returncode, 0)
+            self.assertEqual(piped.stdout.strip(), reader.render_ascii(test_file).strip())
+            self.assertIn("Piped", piped.stdout)
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_cli_renders_batch_into_output_dir(self):
+        import shutil
+        import subprocess
+        import tempfile
+        input_dir = tempfile.mkdtemp()
+        output_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(input_dir, "one.diag"), "w") as f:
+                f.write("Square(One)")
+            os.makedirs(os.path.join(input_dir, "nested"))
+            with open(os.path.join(input_dir, "nested", "two.diag"), "w") as f:
+                f.write("Rectangle(Two) connects to horizontal Circle(Three)")
+            os.makedirs(os.path.join(input_dir, "other"))
+            with open(os.path.join(input_dir, "other", "one.diag"), "w") as f:
+                f.write("Circle(Other)")
+            with open(os.path.join(input_dir, "one"), "w") as f:
+                f.write("Square(Clash)")
+            
+            result = subprocess.run([sys.executable, "src/main.py", "--jobs", "2", "--output-dir", output_dir,
+                                     input_dir, os.path.join(input_dir, "one"),
+                                     os.path.join(input_dir, "missing*.diag")],
+                                    capture_output=True, text=True)
+            self.assertEqual(result.returncode, 1)
+            self.assertIn("Rendered 3 of 5 files", result.stderr)
+            # Outputs mirror the inputs' paths, and no input overwrites another's output
+            with open(os.path.join(output_dir, "one.txt")) as f:
+                self.assertEqual(f.read(), "┌─────┐\n│ One │\n└─────┘\n")
+            self.assertIn(f"FAILED  {os.path.join(input_dir, 'one')}: ", result.stderr)
+            reader = DiagReader()
+            with open(os.path.join(output_dir, "nested", "two.txt")) as f:
+                self.assertEqual(f.read(), reader.render_ascii(os.path.join(input_dir, "nested", "two.diag")) + "\n")
+            with open(os.path.join(output_dir, "other", "one.txt")) as f:
+                self.assertIn("Other", f.read())
+        finally:
+            shutil.rmtree(input_dir)
+            shutil.rmtree(output_dir)
+
+    def test_batch_renderer_keeps_input_order_and_reports_errors(self):
+        from diaglang.batch_renderer import BatchRenderer
+        test_files = ["test_batch_a.diag", "test_batch_b.diag"]
+        for name, content in zip(test_files, ["Square(A)", "Circle(B)"]):
+            with open(name, "w") as f:
+                f.write(content)
+        
+        try:
+            batch = BatchRenderer(jobs=2)
+            files, missing = batch.expand_inputs(test_files + ["test_batch_a.diag", "test_batch_none*.diag"])
+            self.assertEqual(files, test_files)
+            self.assertEqual(missing, ["test_batch_none*.diag"])
+            results = batch.render_files(files + ["test_batch_missing.diag"])
+            self.assertEqual([filename for filename, _, _, _ in results], files + ["test_batch_missing.diag"])
+            self.assertEqual(results[0][1], DiagReader().render_ascii("test_batch_a.diag"))
+            self.assertIsNone(results[2][1])
+            self.assertIsNotNone(results[2][2])
+        finally:
+            for name in test_files:
+                if os.path.exists(name):
+                    os.remove(name)
+
+    def test_render_cache_reuses_output_and_counts_hits(self):
+        import shutil
+        import tempfile
+        from diaglang import RenderCache
+        cache_dir = tempfile.mkdtemp()
+        test_file = "test_render_cache.diag"
+        with open(test_file, "w") as f:
+            f.write("cause connects to horizontal effect")
+        
+        try:
+            cache = RenderCache(cache_dir)
+            reader = DiagReader(render_cache=cache)
+            first = reader.render_ascii(test_file, default_shape="rectangle")
+            second = DiagReader(render_cache=RenderCache(cache_dir)).render_ascii(test_file, default_shape="rectangle")
+            self.assertEqual(first, second)
+            self.assertEqual(first, DiagReader().render_ascii(test_file, default_shape="rectangle"))
+            self.assertEqual(cache.stats()["misses"], 1)
+            
+            # A different option or different content is a different key
+            reader.render_ascii(test_file, default_shape="circle")
+            self.assertEqual(reader.render_string("Square(A)"), "┌───┐\n│ A │\n└───┘")
+            self.assertEqual(reader.render_string("Square(A)"), "┌───┐\n│ A │\n└───┘")
+            self.assertEqual(cache.stats(), {"hits": 1, "misses": 3, "hit_rate": 0.25})
+            
+            # The key and the output come from one read, even if the file is saved in between
+            read_bytes = reader.file_operations.read_bytes
+            
+            def read_then_save(filename):
+                data = read_bytes(filename)
+                with open(filename, "w") as f:
+                    f.write("Square(Saved)")
+                return data
+            
+            with open(test_file, "w") as f:
+                f.write("Square(Read)")
+            reader.file_operations.read_bytes = read_then_save
+            self.assertIn("│ Read │", reader.render_ascii(test_file))
+            reader.file_operations.read_bytes = read_bytes
+            self.assertIn("│ Saved │", reader.render_ascii(test_file))
+            with open(test_file, "w") as f:
+                f.write("Square(Read)")
+            self.assertIn("│ Read │", reader.render_ascii(test_file))
+            self.assertEqual(cache.stats()["hits"], 2)
+        finally:
+            shutil.rmtree(cache_dir)
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_render_cache_evicts_least_recently_used(self):
+        import shutil
+        import tempfile
+        import time
+        from diaglang import RenderCache
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = RenderCache(cache_dir, max_bytes=25)
+            cache.put("old", "x" * 10)
+            cache.put("used", "y" * 10)
+            past = time.time() - 100
+            os.utime(os.path.join(cache_dir, "old.txt"), (past, past))
+            os.utime(os.path.join(cache_dir, "used.txt"), (past + 1, past + 1))
+            self.assertEqual(cache.get("old"), "x" * 10)  # refreshes "old"
+            cache.put("new", "z" * 10)
+            self.assertIsNone(cache.get("used"))
+            self.assertEqual(cache.get("old"), "x" * 10)
+            self.assertEqual(cache.get("new"), "z" * 10)
+            self.assertFalse([name for name in os.listdir(cache_dir) if name.endswith(".tmp")])
+            
+            # The directory is scanned on the first write and then only when the
+            # running total goes over the limit, not on every write
+            cache = RenderCache(cache_dir, max_bytes=1000)
+            scans = []
+            evict = cache._evict
+            cache._evict = lambda: scans.append(1) or evict()
+            for i in range(90):
+                cache.put(f"small{i}", "v" * 10)
+            self.assertEqual(len(scans), 1)
+            for i in range(200):
+                cache.put(f"more{i}", "w" * 10)
+            self.assertLess(len(scans), 30)
+            self.assertLessEqual(sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir)), 1000)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_incremental_render_reuses_unchanged_lines(self):
+        test_file = "test_incremental.diag"
+        lines = ["Square(A)", "Rectangle(B) connects to horizontal Circle(C)", "Triangle(D)"]
+        with open(test_file, "w") as f:
+            f.write("\n".join(lines))
+        
+        try:
+            reader = DiagReader()
+            output, memo = reader.render_incremental(test_file)
+            self.assertEqual(output, reader.render_ascii(test_file))
+            
+            lines[2] = "Triangle(Edited)"
+            with open(test_file, "w") as f:
+                f.write("\n".join(lines))
+            output, memo = reader.render_incremental(test_file, memo)
+            self.assertEqual(output, reader.render_ascii(test_file))
+            # Only the edited line is lexed and rendered again
+            self.assertEqual(memo.computed, 2)
+            self.assertEqual(memo.reused, 4)
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_watcher_rerenders_only_changed_files(self):
+        from diaglang.watcher import DiagramWatcher
+        test_files = ["test_watch_a.diag", "test_watch_b.diag"]
+        for name, content in zip(test_files, ["Square(A)", "Circle(B)"]):
+            with open(name, "w") as f:
+                f.write(content)
+        
+        try:
+            watcher = DiagramWatcher(DiagReader(), test_files)
+            self.assertEqual([filename for filename, _, _ in watcher.poll()], test_files)
+            self.assertEqual(watcher.poll(), [])
+            
+            with open(test_files[1], "w") as f:
+                f.write("Circle(Changed)")
+            os.utime(test_files[1], ns=(1, 1))
+            results = watcher.poll()
+            self.assertEqual(len(results), 1)
+            self.assertEqual(results[0][0], test_files[1])
+            self.assertIn("Changed", results[0][1])
+        finally:
+            for name in test_files:
+                if os.path.exists(name):
+                    os.remove(name)
+
+    def test_render_daemon_serves_requests_over_unix_socket(self):
+        import shutil
+        import tempfile
+        import threading
+        from diaglang.server import RenderServer, RenderClient
+        socket_dir = tempfile.mkdtemp()
+        socket_path = os.path.join(socket_dir, "diaglang.sock")
+        test_file = "test_daemon.diag"
+        with open(test_file, "w") as f:
+            f.write("Title(Daemon)\nRectangle(A) connects to(x, point to) horizontal Circle(B)")
+        
+        server = RenderServer(socket_path, workers=1)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client = RenderClient(socket_path, timeout=30)
+            reader = DiagReader()
+            self.assertEqual(client.render(filename=test_file), reader.render_ascii(test_file))
+            self.assertEqual(client.render(source="bare", default_shape="square"),
+                             reader.render_string("bare", default_shape="square"))
+            with self.assertRaises(RuntimeError):
+                client.render(filename="test_daemon_missing.diag")
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            shutil.rmtree(socket_dir)
+            if os.path.exists(test_file):
+                os.remove(test_file)
+        self.assertFalse(os.path.exists(socket_path))
+
+    def test_cli_daemon_flag_falls_back_without_daemon(self):
+        import subprocess
+        test_file = "test_cli_daemon.diag"
+        with open(test_file, "w") as f:
+            f.write("Square(CLI)")
+        
+        try:
+            result = subprocess.run([sys.executable, "src/main.py", "--daemon", "--socket", "no-daemon-here.sock", test_file],
+                                    capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0)
+            self.assertEqual(result.stdout.strip(), "┌─────┐\n│ CLI │\n└─────┘")
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_package_imports_submodules_lazily(self):
+        import subprocess
+        code = ("import sys, diaglang\n"
+                "assert 'diaglang.chain_system' not in sys.modules\n"
+                "assert diaglang.DiagReader is diaglang.DiagramRenderer\n"
+                "assert 'diaglang.chain_system' in sys.modules\n"
+                "assert all(hasattr(diaglang, name) for name in diaglang.__all__)\n")
+        env = dict(os.environ, PYTHONPATH="src")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_subsystems_share_one_set_of_components(self):
+        reader = DiagReader()
+        self.assertIs(reader.chain_system.shape_renderer, reader.shape_renderer)
+        self.assertIs(reader.chain_system.connection_system, reader.connection_system)
+        self.assertIs(reader.connection_system.shape_renderer, reader.shape_renderer)
+        self.assertIs(reader.divergent_connections.shape_renderer, reader.shape_renderer)
+        self.assertIs(reader.network_system.shape_renderer, reader.shape_renderer)
+        for subsystem in (reader.connection_system, reader.chain_system,
+                          reader.divergent_connections, reader.network_system):
+            self.assertIs(subsystem.lexer, reader.lexer)
+
+    def test_startup_import_time_within_budget(self):
+        import subprocess
+        # Generous budget so the check only trips on real regressions, not noisy machines
+        result = subprocess.run([sys.executable, "benchmarks/startup.py", "--budget-ms", "150", "--runs", "3"],
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+
+    def test_shape_renderer_memoizes_rendered_lines(self):
+        from diaglang import ShapeRenderer
+        renderer = ShapeRenderer(max_cached_shapes=2)
+        box = renderer.render_shape("rectangle", "Node")
+        self.assertEqual(box.lines, ("┌──────┐", "│ Node │", "└──────┘"))
+        self.assertEqual((box.width, box.height, box.center), (8, 3, 4))
+        self.assertIs(renderer.shape_lines("Rectangle(Node)"), box)
+        self.assertEqual(renderer.render_single_shape("Rectangle(Node)"), "\n".join(box.lines))
+        self.assertEqual(renderer.cache_info(), {"hits": 2, "misses": 1, "size": 1, "max_size": 2})
+        
+        # Least recently used entries are dropped past the bound
+        renderer.render_shape("circle", "A")
+        renderer.render_shape("rectangle", "Node")
+        renderer.render_shape("triangle", "B")
+        self.assertEqual(renderer.cache_info()["size"], 2)
+        self.assertIs(renderer.render_shape("rectangle", "Node"), box)
+        self.assertEqual(renderer.cache_info()["misses"], 3)
+
+    def test_canvas_draws_in_place_and_joins_once(self):
+        from diaglang import Canvas
+        canvas = Canvas()
+        canvas.blit(("┌─┐", "└─┘"), 2, 0)
+        canvas.hline(0, 3, 3)
+        canvas.vline(1, 4, 2)
+        canvas.append(0, "!")
+        canvas.write(3, 1, "┬")
+        self.assertEqual((canvas.height, canvas.width), (6, 6))
+        self.assertEqual(canvas.char_at(3, 1), "┬")
+        self.assertEqual(canvas.to_string(), "  ┌─┐!\n  └┬┘\n\n───\n │\n │")
+    
+    def test_wide_horizontal_chain_renders_in_linear_time(self):
+        reader = DiagReader()
+        source = "Rectangle(A)" + " connects to horizontal Rectangle(B)" * 5000
+        lines = reader.render_string(source).split("\n")
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(len(lines[1]), 5 + 5000 * (6 + 5))
+        self.assertEqual(lines[1].count("│ B │"), 5000)
+
+    def test_numpy_canvas_backend_renders_identically(self):
+        import importlib.util
+        from diaglang.canvas import Canvas, get_canvas_class
+        canvas_class = get_canvas_class("numpy")
+        if importlib.util.find_spec("numpy") is None:
+            # Falls back to the pure-Python canvas
+            self.assertIs(canvas_class, Canvas)
+        else:
+            self.assertEqual(canvas_class.__name__, "NumpyCanvas")
+        with self.assertRaises(ValueError):
+            get_canvas_class("gpu")
+        
+        source = "\n".join([
+            "Rectangle(A) connects to(flows) vertical point to Circle(B)",
+            "Triangle(T) connects to horizontal Diamond(D) connects to vertical Rectangle(E)",
+            "Rectangle(S) connects to horizontal Circle(X) and Triangle(Y) and Rectangle(Z)",
+            "Circle(P) and Triangle(Q) connects to(in) horizontal point to Rectangle(R)",
+        ])
+        expected = DiagReader().render_string(source)
+        self.assertEqual(DiagReader(canvas_backend="numpy").render_string(source), expected)
+        
+        # Batched draws match on both backends
+        for backend in (None, "numpy"):
+            canvas = get_canvas_class(backend)()
+            canvas.blits([(("┌─┐", "└─┘"), 2, 0), ((" /\\", "/  \\"), 0, 4), (("┌─┐", "└─┘"), 6, 1)])
+            canvas.hlines([(0, 3, 3), (4, 3, 2)])
+            canvas.vlines([(9, 0, 4), (1, 6, 0)])
+            canvas.writes([(3, 1, "┬"), (0, 7, "label")])
+            self.assertEqual(canvas.to_string(), "  ┌─┐    │\n  └┬┘ ┌─┐│\n      └─┘│\n─── ──   │\n /\\\n/  \\\n\nlabel")
+
+    def test_complex_network_is_laid_out_in_ranks(self):
+        reader = DiagReader()
+        ascii_art = reader.render_string(
+            "Rectangle(A) connects to horizontal Rectangle(Hub)\n"
+            "Rectangle(Hub) connects to vertical Circle(Out)\n"
+            "Rectangle(B) connects to horizontal Rectangle(Hub)"
+        )
+        self.assertEqual(ascii_art, "\n".join([
+            "┌───┐",
+            "│ A │──┐                   ______  ",
+            "└───┘  │    ┌─────┐       /      \\ ",
+            "       └─┬──│ Hub │──────|  Out   |",
+            "┌───┐    │  └─────┘       \\______/ ",
+            "│ B │────┘",
+            "└───┘",
+        ]))
+    
+    def test_layered_layout_breaks_cycles_and_scales(self):
+        import random
+        from diaglang.layered_layout import LayeredLayout
+        
+        layout = LayeredLayout().layout([(3, 3)] * 3, [(0, 1), (1, 2), (2, 0), (1, 1)])
+        # One rank per node, each edge drawn from its source's side to its target's
+        self.assertEqual(sorted(x for x, y, width, height in layout.boxes), [0, 9, 19])
+        self.assertEqual(layout.edges[0][0], (3, 2))
+        self.assertEqual(layout.edges[2][0], (18, 2))
+        self.assertEqual(layout.edges[2][-1], (3, 2))
+        self.assertIsNone(layout.edges[3])
+        
+        # A thousand-node network, each node fed by one or two of the fifty before it:
+        # every node is drawn once, and ranks share rows instead of stacking up
+        random.seed(7)
+        lines = []
+        for node in range(1, 1000):
+            for source in random.sample(range(max(0, node - 50), node), min(node, random.randint(1, 2))):
+                lines.append(f"Rectangle(N{source}) connects to horizontal Rectangle(N{node})")
+        rows = DiagReader().render_string("\n".join(lines)).split("\n")
+        self.assertEqual(sum(row.count("│ N") for row in rows), 1000)
+        self.assertLess(len(rows), 150)
+
+    def test_network_graph_is_compact_with_dict_view(self):
+        from array import array
+        reader = DiagReader()
+        network = reader.network_system.parse_network([
+            "Rectangle(A) connects to horizontal Rectangle(Hub)",
+            "Rectangle(Hub) connects to vertical Circle(Out)",
+            "Rectangle(Hub) connects to vertical Circle(Out) connects to(sends) horizontal Circle(Z)",
+            "Circle(Lone)",
+        ])
+        self.assertEqual(network.names, ["A", "Hub", "Out", "Z", "Lone"])
+        self.assertIsInstance(network.edge_sources, array)
+        self.assertEqual(list(network.edge_targets), [1, 2, 2, 3])  # Every hop of the chain is an edge
+        hub = network.ids["Hub"]
+        self.assertEqual((network.in_degree(hub), network.out_degree(hub)), (1, 2))
+        self.assertEqual(list(network.out_edges(hub)), [1, 2])
+        self.assertEqual(network.in_degree(network.ids["Lone"]), 0)
+        self.assertEqual(network.central_nodes(), [hub, network.ids["Out"]])
+        
+        # The dict view matches what parse_network used to build
+        self.assertEqual(list(network['nodes']), ["A", "Hub", "Out", "Z", "Lone"])
+        self.assertEqual(network['connections'][1], {
+            'source': {'shape': 'rectangle', 'label': 'Hub', 'name': 'Hub'},
+            'target': {'shape': 'circle', 'label': 'Out', 'name': 'Out'},
+            'label': None,
+            'direction': 'vertical',
+        })
+        out = network['nodes']['Out']
+        self.assertEqual((out['shape'], len(out['incoming']), len(out['outgoing'])), ('circle', 2, 1))
+        self.assertEqual(out['outgoing'][0]['label'], 'sends')
+
+    def test_each_line_is_parsed_once_whichever_path_renders_it(self):
+        reader = DiagReader()
+        lexed = []
+        rewritten = []
+        parse_line = reader.lexer.parse_line
+        apply_default_shape = reader.lexer.apply_default_shape
+        reader.lexer.parse_line = lambda line: lexed.append(line) or parse_line(line)
+        reader.lexer.apply_default_shape = lambda line, shape: rewritten.append(line) or apply_default_shape(line, shape)
+        
+        # Two connection lines that share no node: not a network, so only the
+        # connection lines are lexed up front and the rest as they are rendered
+        source = "Title(T)\nA connects to horizontal B\nC connects to vertical D\nE"
+        diagram = reader.parse_diagram(source.split("\n"), default_shape="rectangle")
+        self.assertEqual(diagram.title, "T")
+        self.assertEqual((diagram.line_count, diagram.connection_lines), (3, 2))
+        self.assertFalse(diagram.may_be_network)
+        self.assertEqual(rewritten, ["A connects to horizontal B", "C connects to vertical D"])
+        self.assertEqual(lexed, ["Rectangle(A) connects to horizontal Rectangle(B)",
+                                 "Rectangle(C) connects to vertical Rectangle(D)"])
+        
+        del lexed[:], rewritten[:]
+        ascii_art = reader.render_string(source, default_shape="rectangle")
+        self.assertEqual(ascii_art.count("┌"), 5)
+        self.assertEqual(rewritten, source.split("\n")[1:])
+        self.assertEqual(len(lexed), 3)
+        
+        # B both ends one connection and starts another: the statements are kept for the network
+        del lexed[:], rewritten[:]
+        source = "A connects to horizontal B\nB connects to vertical D\nE"
+        diagram = reader.parse_diagram(source.split("\n"), default_shape="rectangle")
+        self.assertTrue(diagram.may_be_network)
+        self.assertEqual(len(diagram.statements), 3)
+        self.assertEqual(rewritten, source.split("\n"))
+        self.assertEqual(len(lexed), 3)
+        del lexed[:], rewritten[:]
+        reader.render_string(source, default_shape="rectangle")
+        self.assertEqual(rewritten, source.split("\n"))
+        self.assertEqual(len(lexed), 3)
+
+    def test_network_edges_keep_labels_and_arrows_without_reparsing(self):
+        reader = DiagReader()
+        reader.connection_system.parse_connection = None  # Network rendering must not go back through text
+        
+        ascii_art = reader.render_string("\n".join([
+            "Rectangle(A) connects to(req, point to) horizontal Rectangle(Hub)",
+            "Rectangle(B) connects to(point back) horizontal Rectangle(Hub)",
+            "Rectangle(Hub) connects to(log) horizontal Circle(Disk)",
+        ]))
+        self.assertNotIn(") connects t", ascii_art)
+        self.assertEqual(ascii_art.count("┌"), 3)  # A, B and Hub, each drawn once
+        self.assertIn("│ A │─req─", ascii_art)
+        self.assertIn("│ B │<─", ascii_art)
+        self.assertIn(">│ Hub │", ascii_art)
+        self.assertIn("│ Hub │─log─", ascii_art)
+        
+        # Without a central node each connection is drawn on its own, as a single line would be
+        network = reader.network_system.parse_network([
+            "Rectangle(A) connects to(sends, double point) horizontal Circle(B)",
+            "Rectangle(C) connects to(point to) vertical Rectangle(D)",
+        ])
+        expected = "\n\n".join([
+            reader.connection_system.render_connection("Rectangle(A)", "Circle(B)", True, "sends", "double point"),
+            reader.connection_system.render_connection("Rectangle(C)", "Rectangle(D)", False, None, "point to"),
+        ])
+        self.assertEqual(reader.network_system.render_network(network), expected)
+        self.assertIn("<───sends───>", expected)
+
+    def test_mixed_chain_appends_next_to_the_last_shape_in_linear_time(self):
+        reader = DiagReader()
+        ascii_art = reader.render_string(
+            "Rectangle(A) connects to horizontal Rectangle(B) connects to vertical Rectangle(C) "
+            "connects to horizontal Rectangle(D)"
+        )
+        self.assertEqual(ascii_art, "\n".join([
+            "┌───┐      ┌───┐",
+            "│ A │──────│ B │",
+            "└───┘      └─┬─┘",
+            "             │",
+            "             │",
+            "           ┌───┐      ┌───┐",
+            "           │ C │──────│ D │",
+            "           └───┘      └───┘",
+        ]))
+        
+        # A long vertical run followed by a long horizontal one
+        parts = ["Rectangle(N0)"]
+        for i in range(1, 5000):
+            parts.append(("vertical" if i < 2500 else "horizontal") + f" Rectangle(N{i})")
+        ascii_art = reader.render_string(" connects to ".join(parts))
+        self.assertLess(len(ascii_art), 300000)
+        self.assertEqual(ascii_art.count("│ N"), 5000)
+        self.assertIn("│ N2499 │──────│ N2500 │", ascii_art)
+
+    def test_fan_out_and_fan_in_are_routed_over_a_bus(self):
+        reader = DiagReader()
+        ascii_art = reader.render_string("Rectangle(Src) connects to(x, point to) horizontal Rectangle(A) and Rectangle(B)")
+        self.assertEqual(ascii_art, "\n".join([
+            "                  ┌───┐",
+            "         ┌───x───>│ A │",
+            "┌─────┐  │        └───┘",
+            "│ Src │──┤",
+            "└─────┘  │        ┌───┐",
+            "         └───x───>│ B │",
+            "                  └───┘",
+        ]))
+        ascii_art = reader.render_string("Rectangle(A) and Rectangle(B) connects to(y) horizontal Rectangle(Dst)")
+        self.assertEqual(ascii_art, "\n".join([
+            "┌───┐",
+            "│ A │──y──┐",
+            "└───┘     │  ┌─────┐",
+            "          ├──│ Dst │",
+            "┌───┐     │  └─────┘",
+            "│ B │──y──┘",
+            "└───┘",
+        ]))
+        
+        # 10,000-way fan-out and fan-in
+        names = " and ".join(f"Rectangle(T{i})" for i in range(10000))
+        for line in (f"Rectangle(Src) connects to horizontal {names}",
+                     f"{names} connects to horizontal Rectangle(Dst)"):
+            ascii_art = reader.render_string(line)
+            self.assertEqual(ascii_art.count("\n"), 4 * 10000 - 2)
+            self.assertEqual(ascii_art.count("│ T"), 10000)
+
+    def test_measure_matches_rendered_shapes_without_rendering(self):
+        from diaglang import ShapeRenderer
+        reader = DiagReader()
+        renderer = reader.shape_renderer
+        for shape_type in ("square", "rectangle", "circle", "triangle", "diamond", "hexagon"):
+            for label in (None, "", "a", "ab", "abc", "abcd", "abcde", "Load Balancer"):
+                metrics = renderer.measure(shape_type, label)
+                self.assertEqual(renderer.cache_info()['misses'], 0)
+                rendered = ShapeRenderer().render_shape(shape_type, label)
+                self.assertEqual((metrics.width, metrics.height, metrics.center, metrics.middle),
+                                 (rendered.width, rendered.height, rendered.center, rendered.height // 2))
+        self.assertEqual(renderer.shape_metrics("Diamond(Decision)"), renderer.measure("diamond", "Decision"))
+
+    def test_layout_is_inspectable_and_repaintable(self):
+        from diaglang import Scene, ScenePainter
+        from diaglang.canvas import Canvas
+        from diaglang.scene import GLYPHS, Box, Label, Wire
+        reader = DiagReader()
+        
+        scene = reader.connection_system.layout_connection("Rectangle(A)", "Circle(B)", True, "go", "point to")
+        self.assertIsInstance(scene, Scene)
+        self.assertEqual(scene.boxes, [Box(0, 0, 5, 3, "rectangle", "A"), Box(14, 0, 10, 4, "circle", "B")])
+        self.assertEqual(scene.wires, [Wire([(5, 1), (13, 1)], "point to")])
+        self.assertEqual(scene.labels, [Label(8, 1, "go")])
+        self.assertEqual(reader.connection_system.painter.paint_string(scene),
+                         reader.render_string("Rectangle(A) connects to(go, point to) horizontal Circle(B)"))
+        
+        # Every system lays out first and paints second
+        connections = reader.chain_system.parse_chain("Rectangle(A) connects to horizontal Rectangle(B) connects to vertical Rectangle(C)")
+        self.assertEqual([box.label for box in reader.chain_system.layout_chain(connections).boxes], ["A", "B", "C"])
+        fan_out = reader.divergent_connections.layout_divergent_connections(
+            reader.divergent_connections.parse_divergent_connections("Rectangle(S) connects to horizontal Rectangle(X) and Rectangle(Y)"))
+        self.assertEqual([(box.label, box.x, box.y) for box in fan_out.boxes], [("S", 0, 2), ("X", 14, 0), ("Y", 14, 4)])
+        network = reader.network_system.parse_network(["Rectangle(A) connects to horizontal Rectangle(B)",
+                                                      "Rectangle(A) connects to horizontal Rectangle(C)"])
+        self.assertEqual(len(reader.network_system.layout_network(network).wires), 2)
+        
+        # The same layout repainted with other glyphs
+        painter = ScenePainter(glyphs=dict(GLYPHS, arrow_east="→"))
+        self.assertIn("│ A │───go───→ /", painter.paint_string(scene))
+        
+        # Boxes are blitted whole and wires drawn as straight runs, not cell by cell
+        calls = []
+        class CountingCanvas(Canvas):
+            def blit(self, shape, x, y):
+                calls.append("blit")
+                super().blit(shape, x, y)
+            def hline(self, x, y, length, char='─'):
+                calls.append("hline")
+                super().hline(x, y, length, char)
+            def vline(self, x, y, length, char='│'):
+                calls.append("vline")
+                super().vline(x, y, length, char)
+        long_wires = Scene([Box(0, 0, 5, 3, "rectangle", "A"), Box(60, 30, 5, 3, "rectangle", "B")],
+                           [Wire([(5, 1), (30, 1), (30, 31), (59, 31)], "point to")], [], [], [65] * 33)
+        canvas = ScenePainter(canvas_class=CountingCanvas).paint(long_wires)
+        self.assertEqual(sorted(calls), ["blit", "blit", "hline", "hline", "vline"])
+        self.assertEqual(canvas.row_text(1), "│ A │" + "─" * 25 + "┐" + " " * 34)
+        self.assertEqual(canvas.row_text(31)[29:], " └" + "─" * 28 + ">│ B │")
+
+    def test_network_components_laid_out_separately(self):
+        from diaglang.network_system import NetworkSystem
+        reader = DiagReader()
+        lines = ["Rectangle(A) connects to horizontal Rectangle(Hub)",
+                 "Rectangle(Hub) connects to horizontal Rectangle(Z)",
+                 "Rectangle(Q) connects to horizontal Rectangle(R)",
+                 "Rectangle(Lone)"]
+        network = reader.network_system.parse_network(lines)
+        self.assertEqual(network.components(), [([0, 1, 2], [0, 1]), ([3, 4], [2]), ([5], [])])
+        self.assertEqual(reader.network_system.render_network(network), "\n".join([
+            "┌───┐      ┌─────┐      ┌───┐",
+            "│ A │──────│ Hub │──────│ Z │",
+            "└───┘      └─────┘      └───┘",
+            "",
+            "┌───┐      ┌───┐",
+            "│ Q │──────│ R │",
+            "└───┘      └───┘",
+            "",
+            "┌──────┐",
+            "│ Lone │",
+            "└──────┘",
+        ]))
+        
+        # Many tenants laid out in a process pool pack exactly like a serial layout
+        lines = []
+        for tenant in range(200):
+            lines += [f"Rectangle(LB{tenant}) connects to horizontal Rectangle(App{tenant})",
+                      f"Rectangle(App{tenant}) connects to horizontal Rectangle(DB{tenant})"]
+        network = reader.network_system.parse_network(lines)
+        self.assertEqual(len(network.components()), 200)
+        serial = reader.network_system.render_network(network)
+        parallel = NetworkSystem(reader.shape_renderer, reader.connection_system, workers=2)
+        try:
+            self.assertEqual(parallel.render_network(network), serial)
+            self.assertTrue(parallel.pool.started)
+        finally:
+            parallel.pool.close()
+        self.assertEqual(serial.count("│ App"), 200)
+
+    def test_parallel_line_rendering_matches_serial(self):
+        import subprocess
+        lines = ["Title(Parallel)", "Square(First)", "Rectangle(A) connects to vertical Circle(B)",
+                 "Circle(x) connects to horizontal Diamond(y)", "Shape(bad) connects to Circle(z)", ""]
+        for i in range(300):
+            lines.append(f"Rectangle(A{i}) connects to(l{i}, point to) horizontal Circle(B{i}) and Triangle(C{i})")
+        source = "\n".join(lines)
+        serial = DiagReader().render_string(source)
+        reader = DiagReader(workers=3)
+        try:
+            # Short diagrams aren't worth starting the pool for
+            self.assertEqual(reader.render_string("\n".join(lines[:5])), DiagReader().render_string("\n".join(lines[:5])))
+            self.assertFalse(reader.pool.started)
+            self.assertEqual(reader.render_string(source), serial)
+            # The pool started by the first parallel render is kept for the next ones
+            executor = reader.pool._executor
+            self.assertEqual(reader.render_string(source, default_shape="rectangle"),
+                             DiagReader().render_string(source, default_shape="rectangle"))
+            self.assertIs(reader.pool._executor, executor)
+            self.assertIs(reader.network_system.pool, reader.pool)
+        finally:
+            reader.close()
+        self.assertFalse(reader.pool.started)
+        
+        test_file = "test_cli_jobs.diag"
+        with open(test_file, "w") as f:
+            f.write(source)
+        try:
+            plain = subprocess.run([sys.executable, "src/main.py", test_file],
+                                   capture_output=True, text=True)
+            parallel = subprocess.run([sys.executable, "src/main.py", "--jobs", "2", test_file],
+                                      capture_output=True, text=True)
+            self.assertEqual(parallel.returncode, 0)
+            self.assertEqual(parallel.stdout, plain.stdout)
+        finally:
+            if os.path.exists(test_file):
+                os.remove(test_file)
+
+    def test_default_shape_rewrite_is_linear_on_huge_lines(self):
+        import time
+        reader = DiagReader()
+        self.assertEqual(reader._apply_default_shape("web  connects   to(x) horizontal db and cache", "circle"),
+                         "Circle(web) connects to(x) horizontal Circle(db and cache)")
+        self.assertEqual(reader._apply_default_shape("Square(A) and b and Square(c) connects to vertical d e", "rectangle"),
+                         "Square(A) and Rectangle(b) and Square(c) connects to vertical Rectangle(d e)")
+        
+        # 100 KB lines that made the old regexes backtrack quadratically
+        huge_lines = [
+            "A connects to " + "horizontal b " * 7700 + "(",
+            "a" + " " * 100000 + "connectsx",
+            "Hub and " + "and b" * 20000 + "!",
+            "x" * 100000 + " connects to horizontal y",
+        ]
+        for line in huge_lines:
+            self.assertGreaterEqual(len(line), 100000)
+            start = time.perf_counter()
+            rewritten = reader._apply_default_shape(line, "rectangle")
+            reader.render_string(line, default_shape="rectangle")
+            self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertTrue(rewritten.startswith("Rectangle(xxx"))
+        self.assertTrue(rewritten.endswith(") connects to horizontal Rectangle(y)"))
+
+    def test_render_limits_raise_or_degrade(self):
+        from diaglang import RenderLimits, RenderLimitExceeded
+        source = "\n".join(["Title(Limited)", "Square(A)", "Rectangle(" + "x" * 500 + ")",
+                            "Rectangle(B) connects to horizontal Circle(C)"])
+        
+        # Structured errors
+        with self.assertRaises(RenderLimitExceeded) as raised:
+            DiagReader(limits=RenderLimits(max_line_length=100)).render_string(source)
+        self.assertEqual(raised.exception.to_dict(), {'limit': 'line_length', 'value': 511, 'maximum': 100})
+        with self.assertRaises(RenderLimitExceeded) as raised:
+            DiagReader(limits=RenderLimits(max_nodes=3)).render_string(source)
+        self.assertEqual((raised.exception.limit, raised.exception.value), ('nodes', 4))
+        with self.assertRaises(RenderLimitExceeded) as raised:
+            DiagReader(limits=RenderLimits(max_output_cells=100)).render_string(source)
+        self.assertEqual(raised.exception.limit, 'output_cells')
+        
+        # Degraded renders keep what fits and say what didn't
+        plain = DiagReader().render_string(source).split("\n\n")
+        degraded = DiagReader(limits=RenderLimits(max_line_length=100, degrade=True)).render_string(source).split("\n\n")
+        self.assertEqual(degraded, [plain[0], plain[1], "LIMIT EXCEEDED: line_length 511 is over the limit of 100", plain[3]])
+        degraded = DiagReader(limits=RenderLimits(max_edges=0, degrade=True)).render_string(source).split("\n\n")
+        self.assertEqual(degraded[:3], plain[:3])
+        self.assertEqual(degraded[3], "LIMIT EXCEEDED: edges 1 is over the limit of 0")
+        self.assertEqual(DiagReader(limits=RenderLimits()).render_string(source), DiagReader().render_string(source))
+        
+        # Networks are checked before they are laid out and painted
+        network = "\n".join(f"Rectangle(N{i}) connects to horizontal Rectangle(N{i + 1})" for i in range(2000))
+        with self.assertRaises(RenderLimitExceeded) as raised:
+            DiagReader(limits=RenderLimits(max_edges=1000)).render_string(network)
+        self.assertEqual(raised.exception.to_dict(), {'limit': 'edges', 'value': 2000, 'maximum': 1000})
+        degraded = DiagReader(limits=RenderLimits(max_output_cells=10000, degrade=True)).render_string(network)
+        self.assertTrue(degraded.startswith("LIMIT EXCEEDED: output_cells"))
+        self.assertNotIn("\n", degraded)
+        
+        # Running out of time stops the render between lines
+        with self.assertRaises(RenderLimitExceeded) as raised:
+            DiagReader(limits=RenderLimits(max_seconds=0)).render_string(source)
+        self.assertEqual(raised.exception.limit, 'seconds')
+
+    def test_async_renderer_bounds_concurrency_and_cancels(self):
+        import asyncio
+        from diaglang import AsyncDiagramRenderer
+        sources = [f"Rectangle(A{i}) connects to(x) horizontal Circle(B{i})" for i in range(8)]
+        expected = [DiagReader().render_string(source) for source in sources]
+        big = "\n".join(f"Rectangle(N{i}) connects to horizontal Rectangle(N{i + 1})" for i in range(3000))
+        
+        async def main():
+            async with AsyncDiagramRenderer(max_workers=4, max_concurrency=2) as renderer:
+                # Renders run off the event loop, never more than two at a time
+                in_flight = []
+                submit = renderer.executor.submit
+                def counting_submit(function, *args):
+                    in_flight.append(renderer.max_concurrency - renderer._slots._value)
+                    return submit(function, *args)
+                renderer.executor.submit = counting_submit
+                results = await asyncio.gather(*(renderer.render(source) for source in sources))
+                self.assertEqual(results, expected)
+                self.assertLessEqual(max(in_flight), 2)
+                
+                # A cancelled render raises CancelledError and frees its slot
+                task = asyncio.ensure_future(renderer.render(big))
+                await asyncio.sleep(0)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                self.assertEqual(renderer._slots._value, 2)
+                
+                test_file = "test_async_render.diag"
+                with open(test_file, "w") as f:
+                    f.write("Title(Async)\n" + sources[0])
+                try:
+                    self.assertEqual(await renderer.render_file(test_file), DiagReader().render_ascii(test_file))
+                finally:
+                    os.remove(test_file)
+        
+        asyncio.run(main())
+        
+        with self.assertRaises(ValueError):
+            AsyncDiagramRenderer(executor="fibers")
+
+    def test_network_nodes_come_only_from_shapes(self):
+        reader = DiagReader()
+        lines = [
+            "Rectangle(A) connects to(reads) horizontal Rectangle(B)",
+            "Rectangle(B) connects to(writes, point to) horizontal Circle(C) and Circle(D)",
+            "Circle(D) connects to horizontal Rectangle(E) connects to vertical Rectangle(F)",
+            "Square(Alone)",
+        ]
+        network = reader.network_system.parse_network(lines)
+        self.assertEqual(network.names, ["A", "B", "C", "D", "E", "F", "Alone"])
+        self.assertEqual(network.edge_count, 5)  # Every hop of the fan-out and the chain
+        ascii_art = reader.render_string("\n".join(lines))
+        self.assertEqual(ascii_art, reader.network_system.render_network(network))
+        self.assertNotIn("connects", ascii_art)
+        self.assertIn("─reads─", ascii_art)
+        self.assertIn("writes", ascii_art)
+        for name in network.names:
+            self.assertIn(f" {name} ", ascii_art)
+        
+        # A syntax error anywhere keeps the diagram off the network path, so it is reported
+        for invalid in ["Rectangle(B) connects to Circle(NoDirection)",
+                        "Rectangle(B) connects to(x, sideways) horizontal Circle(C)"]:
+            ascii_art = reader.render_string("\n".join(lines + [invalid]))
+            blocks = ascii_art.split("\n\n")
+            self.assertEqual(len(blocks), len(lines) + 1)
+            self.assertTrue(blocks[-1].startswith(f"SYNTAX ERROR in '{invalid}'"))
+            self.assertEqual(blocks[0], reader.render_string(lines[0]))
+
+    def test_render_limit_errors_cross_process_pools(self):
+        import asyncio
+        import pickle
+        from diaglang import AsyncDiagramRenderer, RenderLimits, RenderLimitExceeded
+        error = pickle.loads(pickle.dumps(RenderLimitExceeded('edges', 3, 2)))
+        self.assertEqual(error.to_dict(), {'limit': 'edges', 'value': 3, 'maximum': 2})
+        self.assertEqual(str(error), "edges 3 is over the limit of 2")
+        
+        async def main():
+            async with AsyncDiagramRenderer(executor="process", max_workers=1,
+                                            limits=RenderLimits(max_edges=2)) as renderer:
+                with self.assertRaises(RenderLimitExceeded) as raised:
+                    await renderer.render("Rectangle(S) connects to horizontal Circle(A) and Circle(B) and Circle(C)")
+                self.assertEqual(raised.exception.to_dict(), {'limit': 'edges', 'value': 3, 'maximum': 2})
+                # The pool survives the error
+                self.assertIn("│ A │", await renderer.render("Rectangle(A)"))
+        
+        asyncio.run(main())
+
+    def test_time_limit_is_checked_while_one_network_is_laid_out(self):
+        from diaglang import RenderLimits, RenderLimitExceeded
+        from diaglang.layered_layout import LayeredLayout
+        reader = DiagReader()
+        lines = [f"Rectangle(N{i}) connects to horizontal Rectangle(N{i // 2})" for i in range(1, 1500)]
+        lines += [f"Rectangle(N{i}) connects to horizontal Rectangle(N{i * 7 % 1500})" for i in range(0, 1500, 10)]
+        network = reader.network_system.parse_network(lines)
+        self.assertEqual(len(network.components()), 1)
+        with self.assertRaises(RenderLimitExceeded) as raised:
+            reader.network_system.render_network(network, RenderLimits(max_seconds=0).budget())
+        self.assertEqual(raised.exception.limit, 'seconds')
+        
+        # The layout checks the time after ranking, every sweep and every rank
+        class CountingBudget:
+            checks = 0
+            
+            def check_time(self):
+                self.checks += 1
+        
+        budget = CountingBudget()
+        chain = LayeredLayout().layout([(3, 3)] * 50, [(i, i + 1) for i in range(49)], budget=budget)
+        self.assertEqual(chain, LayeredLayout().layout([(3, 3)] * 50, [(i, i + 1) for i in range(49)]))
+        self.assertGreaterEqual(budget.checks, 3 * 50)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file